@@ -0,0 +1,119 @@
+import json, os, tempfile, time
+from flask import current_app
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from App.database import db
+from App.models import User, Feed, Distributor, FeedDailyCounter, DEFAULT_AVATAR
+from App.controllers import distribute, distribute_all
+
+try:
+    import resource
+except ImportError:
+    # peak RSS is only reported on unix
+    resource = None
+
+BENCHMARK_SIZES = [10, 100, 1000, 10000]
+
+
+def seed_benchmark_users(count, batch_size=1000):
+    # every synthetic user shares one password hash so seeding doesn't measure hashing
+    password = generate_password_hash("benchpass", method="sha256")
+    for start in range(1, count + 1, batch_size):
+        db.session.execute(
+            User.__table__.insert(),
+            [
+                {
+                    "username": f"bench{i}",
+                    "password": password,
+                    "avatar": DEFAULT_AVATAR,
+                }
+                for i in range(start, min(start + batch_size, count + 1))
+            ],
+        )
+    db.session.commit()
+
+
+def count_written_rows():
+    return sum(model.query.count() for model in (Distributor, Feed, FeedDailyCounter))
+
+
+def get_peak_rss():
+    if resource:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return None
+
+
+def benchmark_distribution(size, mode="round", workers=None):
+    seed_benchmark_users(size)
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.get_engine()
+    event.listen(engine, "before_cursor_execute", count_statement)
+    start = time.perf_counter()
+    try:
+        if mode == "all":
+            rounds = distribute_all(workers=workers)
+        else:
+            distribute(workers=workers)
+            rounds = 1
+    finally:
+        wall_time = time.perf_counter() - start
+        event.remove(engine, "before_cursor_execute", count_statement)
+    return {
+        "users": size,
+        "mode": mode,
+        "rounds": rounds,
+        "wall_time": round(wall_time, 4),
+        "statements": len(statements),
+        "rows_written": count_written_rows(),
+        "peak_rss_kb": get_peak_rss(),
+    }
+
+
+def run_distribution_benchmark(sizes=None, mode="round", workers=None, scratch=None):
+    # runs every size against a fresh scratch sqlite database and switches back afterwards
+    app = current_app._get_current_object()
+    original_uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    if scratch is None:
+        scratch = os.path.join(tempfile.mkdtemp(), "benchmark.db")
+    results = {}
+    try:
+        app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.abspath(scratch)}"
+        for size in sizes or BENCHMARK_SIZES:
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+            results[str(size)] = benchmark_distribution(size, mode, workers)
+        db.session.remove()
+        db.drop_all()
+    finally:
+        db.session.remove()
+        app.config["SQLALCHEMY_DATABASE_URI"] = original_uri
+    return results
+
+
+def compare_benchmark(results, baseline):
+    # ratios above 1 mean the run was slower or did more work than the baseline
+    comparison = {}
+    for size, result in results.items():
+        previous = baseline.get(size)
+        if previous:
+            comparison[size] = {
+                key: round(result[key] / previous[key], 3) if previous[key] else None
+                for key in ("wall_time", "statements", "rows_written")
+            }
+    return comparison
+
+
+def save_benchmark(results, path):
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2)
+
+
+def load_benchmark(path):
+    with open(path) as file:
+        return json.load(file)
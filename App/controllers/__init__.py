@@ -1,7 +1,16 @@
+from .revision import *
 from .auth import *
+from .image_rank import *
 from .user import *
 from .image import *
 from .ranking import *
+from .pair_index import *
+from .feed_counter import *
+from .feed_events import *
 from .distributor import *
+from .planner import *
 from .feed import *
+from .rating_stats import *
 from .rating import *
+from .distribution_job import *
+from .archive import *
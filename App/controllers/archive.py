@@ -0,0 +1,103 @@
+import gzip, json, os, shutil
+from datetime import datetime, timedelta
+from App.database import db
+from App.models import Distributor, Feed, FeedPair
+from App.controllers.distributor import DISTRIBUTION_COLUMNS
+from App.controllers.revision import bump_revisions, feeds_resource
+
+
+def add_feed_pairs(pairs, batch_size=500):
+    # stores the pairs that aren't in the summary yet, in the caller's transaction
+    pairs = set(pairs)
+    receiver_ids = list({receiver_id for sender_id, receiver_id in pairs})
+    for i in range(0, len(receiver_ids), batch_size):
+        existing = db.session.query(FeedPair.sender_id, FeedPair.receiver_id).filter(
+            FeedPair.receiver_id.in_(receiver_ids[i : i + batch_size])
+        )
+        pairs.difference_update(existing)
+    if pairs:
+        db.session.execute(
+            FeedPair.__table__.insert(),
+            [
+                {"sender_id": sender_id, "receiver_id": receiver_id}
+                for sender_id, receiver_id in pairs
+            ],
+        )
+    return len(pairs)
+
+
+def append_archive_part(path):
+    # a batch is written to path.part and only lands in the archive once its delete committed
+    with open(f"{path}.part", "rb") as part, open(path, "ab") as file:
+        shutil.copyfileobj(part, file)
+    os.remove(f"{path}.part")
+
+
+def recover_archive_part(path):
+    # a part left by a crash is appended if its distributors are gone, else written again
+    if not os.path.exists(f"{path}.part"):
+        return
+    with gzip.open(f"{path}.part", "rt") as part:
+        line = part.readline()
+    if line and not Distributor.query.get(json.loads(line)["distributor_id"]):
+        append_archive_part(path)
+    else:
+        os.remove(f"{path}.part")
+
+
+def archive_feeds(days=30, path=None, batch_size=500):
+    # moves distributors older than the horizon and their feeds into a gzipped jsonl file,
+    # one batch of distributors per transaction, and keeps their pairs in FeedPair;
+    # a batch joins the file after its commit, so a re-run doesn't archive it twice
+    cutoff = datetime.now() - timedelta(days=days)
+    if path is None:
+        path = os.path.join("archive", f"feeds-{cutoff:%Y%m%d}.jsonl.gz")
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    recover_archive_part(path)
+    archived = 0
+    while True:
+        distributor_ids = [
+            distributor_id
+            for (distributor_id,) in db.session.query(Distributor.id)
+            .filter(Distributor.timestamp < cutoff)
+            .order_by(Distributor.id)
+            .limit(batch_size)
+        ]
+        if not distributor_ids:
+            break
+        rows = (
+            db.session.query(
+                Feed.id,
+                Feed.receiver_id,
+                Feed.sender_id,
+                Feed.distributor_id,
+                Feed.seen,
+                Distributor.timestamp,
+            )
+            .join(Distributor, Feed.distributor_id == Distributor.id)
+            .filter(Feed.distributor_id.in_(distributor_ids))
+            .order_by(Feed.id)
+            .all()
+        )
+        with gzip.open(f"{path}.part", "wt") as part:
+            for row in rows:
+                row = list(row)
+                row[-1] = row[-1].isoformat()
+                part.write(json.dumps(dict(zip(DISTRIBUTION_COLUMNS, row))) + "\n")
+        add_feed_pairs((row.sender_id, row.receiver_id) for row in rows)
+        bump_revisions(feeds_resource(row.receiver_id) for row in rows)
+        Feed.query.filter(Feed.distributor_id.in_(distributor_ids)).delete(
+            synchronize_session=False
+        )
+        Distributor.query.filter(Distributor.id.in_(distributor_ids)).delete(
+            synchronize_session=False
+        )
+        db.session.commit()
+        append_archive_part(path)
+        archived += len(rows)
+    return archived
+
+
+def get_all_feed_pairs():
+    return FeedPair.query.all()
@@ -0,0 +1,116 @@
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from App.database import db
+from App.models import DistributionJob
+from App.controllers.distributor import distribute_all
+
+# wakes the worker thread up as soon as a job is requested instead of waiting for the next poll
+distribution_wakeup = threading.Event()
+distribution_worker = None
+distribution_worker_lock = threading.Lock()
+
+# a job still running after this long is taken to belong to a worker that died
+DISTRIBUTION_JOB_TIMEOUT = timedelta(hours=1)
+
+
+def request_distribution():
+    # coalesces requests: while a job is still pending, new requests share it
+    job = DistributionJob.query.filter_by(status="pending").first()
+    if not job:
+        job = DistributionJob()
+        db.session.add(job)
+        db.session.commit()
+    start_distribution_worker(current_app._get_current_object())
+    distribution_wakeup.set()
+    return job
+
+
+def get_distribution_job(id):
+    return DistributionJob.query.get(id)
+
+
+def get_last_distribution_job():
+    return DistributionJob.query.order_by(DistributionJob.id.desc()).first()
+
+
+def get_last_distribution_job_json():
+    job = get_last_distribution_job()
+    if job:
+        return job.to_json()
+    return None
+
+
+def fail_stale_distribution_jobs(timeout=DISTRIBUTION_JOB_TIMEOUT):
+    # marks running jobs older than the timeout failed; returns how many were
+    failed = DistributionJob.query.filter(
+        DistributionJob.status == "running",
+        DistributionJob.started_at < datetime.now() - timeout,
+    ).update(
+        {
+            "status": "failed",
+            "error": "timed out",
+            "finished_at": datetime.now(),
+        },
+        synchronize_session=False,
+    )
+    db.session.commit()
+    return failed
+
+
+def run_distribution_job(workers=None):
+    # claims every pending job at once so a burst of requests results in a single run
+    fail_stale_distribution_jobs()
+    last_id = (
+        db.session.query(func.max(DistributionJob.id))
+        .filter(DistributionJob.status == "pending")
+        .scalar()
+    )
+    if last_id is None:
+        return None
+    claimed = DistributionJob.query.filter(
+        DistributionJob.status == "pending", DistributionJob.id <= last_id
+    ).update(
+        {"status": "running", "started_at": datetime.now()},
+        synchronize_session=False,
+    )
+    db.session.commit()
+    # another worker got to the jobs first
+    if not claimed:
+        return None
+    try:
+        result = {"status": "done", "rounds": distribute_all(workers=workers)}
+    except Exception as e:
+        db.session.rollback()
+        result = {"status": "failed", "error": str(e)[:255]}
+    result["finished_at"] = datetime.now()
+    DistributionJob.query.filter(
+        DistributionJob.status == "running", DistributionJob.id <= last_id
+    ).update(result, synchronize_session=False)
+    db.session.commit()
+    return get_distribution_job(last_id)
+
+
+def run_distribution_worker(app, interval=30):
+    with app.app_context():
+        while True:
+            distribution_wakeup.wait(interval)
+            distribution_wakeup.clear()
+            while run_distribution_job():
+                pass
+            db.session.remove()
+
+
+def start_distribution_worker(app):
+    global distribution_worker
+    # tests run jobs synchronously with run_distribution_job
+    if app.testing:
+        return None
+    with distribution_worker_lock:
+        if distribution_worker is None or not distribution_worker.is_alive():
+            distribution_worker = threading.Thread(
+                target=run_distribution_worker, args=(app,), daemon=True
+            )
+            distribution_worker.start()
+    return distribution_worker
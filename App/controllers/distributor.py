@@ -1,16 +1,33 @@
+import csv, io, json
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import select
 from App.database import db
-from App.models import Distributor
-from App.controllers.feed import (
-    get_feeds_by_sender,
-    create_feed,
-    get_feeds_by_receiver,
+from App.models import Distributor, Feed, FeedDailyCounter, FeedPair, User
+from App.controllers.feed import create_feeds
+from App.controllers.pair_index import get_pair_index, reset_pair_index
+from App.controllers.revision import bump_revisions, feeds_resource
+from App.controllers.feed_counter import (
+    add_daily_feed_counts,
+    get_daily_feed_counter,
+    get_daily_feed_counts,
 )
-from App.controllers.user import get_all_users
-from datetime import timedelta, datetime
+from datetime import date
+
+# how many of the newest profiles a signup checks for one without a counter for the day
+DISTRIBUTION_PARTNER_CANDIDATES = 100
+
+DISTRIBUTION_COLUMNS = [
+    "feed_id",
+    "receiver_id",
+    "sender_id",
+    "distributor_id",
+    "seen",
+    "timestamp",
+]
 
 
 def create_distributor():
-    num_users = len(get_all_users())
+    num_users = User.query.count()
     if num_users > 2:
         distributor = Distributor(num_users)
         db.session.add(distributor)
@@ -49,162 +66,273 @@ def get_distributor_feeds(id):
 def delete_distributor(id):
     distributor = Distributor.query.get(id)
     if distributor:
+        add_daily_feed_counts(
+            [(feed.sender_id, feed.receiver_id) for feed in distributor.feed],
+            distributor.timestamp.date(),
+            -1,
+        )
+        bump_revisions(feeds_resource(feed.receiver_id) for feed in distributor.feed)
         db.session.delete(distributor)
         db.session.commit()
+        reset_pair_index()
         return True
     return False
 
 
-def distribute():
-    receivers = []
-    senders = []
+def get_profile_ids():
+    return [user_id for (user_id,) in db.session.query(User.id).order_by(User.id)]
+
+
+def load_distribution_state(day=None):
+    # loads today's counters with one indexed lookup and the already sent pairs from the pair index
+    sent, received = get_daily_feed_counts(day)
+    return sent, received, get_pair_index()
+
+
+def match_feeds(profile_ids, limit, sent, received, pairs, sender_ids=None):
+    # computes the (sender, receiver) assignments for one distribution round without touching the database
+    # each profile sends and receives at most once per round, so the daily counters don't change for any
+    # profile that is still eligible and can be checked against the snapshot
+    assignments = []
+    receivers = set()
+    if sender_ids is None:
+        sender_ids = profile_ids
+    # senders are removed once they've been used, so each scan only walks senders that can still send
+    available = [sender_id for sender_id in sender_ids if sent[sender_id] < limit]
+    # first pass only sends profiles that the receiver hasn't already gotten
+    for receiver_id in profile_ids:
+        if received[receiver_id] < limit:
+            for index, sender_id in enumerate(available):
+                if sender_id != receiver_id and (sender_id, receiver_id) not in pairs:
+                    assignments.append((sender_id, receiver_id))
+                    receivers.add(receiver_id)
+                    del available[index]
+                    break
+    # if the number of receivers is less than the number of profiles, there are no more unique feeds to send
+    # therefore repeats must be sent
+    if len(receivers) < limit:
+        for receiver_id in profile_ids:
+            if receiver_id not in receivers and received[receiver_id] < limit:
+                for index, sender_id in enumerate(available):
+                    if sender_id != receiver_id:
+                        assignments.append((sender_id, receiver_id))
+                        receivers.add(receiver_id)
+                        del available[index]
+                        break
+    return assignments
+
+
+def match_feeds_partitioned(profile_ids, limit, sent, received, pairs, workers):
+    # splits the receivers into id ranges and matches each range in its own process; every partition
+    # starts scanning senders at its own offset so the partitions mostly pick different senders
+    size = -(-len(profile_ids) // workers)
+    partitions = [profile_ids[i : i + size] for i in range(0, len(profile_ids), size)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for i, receiver_ids in enumerate(partitions):
+            futures.append(
+                executor.submit(
+                    match_feeds,
+                    receiver_ids,
+                    limit,
+                    sent,
+                    received,
+                    pairs.subset(receiver_ids),
+                    profile_ids[i * size :] + profile_ids[: i * size],
+                )
+            )
+        results = [future.result() for future in futures]
+    # a sender can only be used once per round, so receivers whose sender was already taken by an
+    # earlier partition are matched again against the senders nobody used
+    assignments = []
+    senders = set()
+    conflicts = []
+    for partition in results:
+        for sender_id, receiver_id in partition:
+            if sender_id in senders:
+                conflicts.append(receiver_id)
+            else:
+                assignments.append((sender_id, receiver_id))
+                senders.add(sender_id)
+    if conflicts:
+        remaining = [sender_id for sender_id in profile_ids if sender_id not in senders]
+        assignments += match_feeds(
+            conflicts, limit, sent, received, pairs, sender_ids=remaining
+        )
+    return assignments
+
+
+def distribute(chunk_size=None, workers=None):
     distributor = create_distributor()
-    # print(f"{distributor.id} and {distributor.num_profiles} ")
     if distributor:
-        # loops through all the profiles for each receiver
-        for receiver_id in range(1, distributor.num_profiles + 1):
-            # list of feeds for the receiver
-            r_feeds = get_feeds_by_receiver(receiver_id)
-            # gets the number of feeds that the receiver has gotten in the past day
-            daily_receiver_counter = len(
-                [
-                    feed
-                    for feed in r_feeds
-                    if feed.distributor.timestamp
-                    >= (datetime.now() - timedelta(days=1))
-                ]
+        sent, received, pairs = load_distribution_state()
+        if workers and workers > 1:
+            assignments = match_feeds_partitioned(
+                get_profile_ids(),
+                distributor.num_profiles,
+                sent,
+                received,
+                pairs,
+                workers,
             )
-            # print(f"count: {daily_receiver_counter}")
-            # if the receiver has gotten less than the number of profiles per day, they can receive more
-            if daily_receiver_counter < distributor.num_profiles:
-                # loops through all the profiles for each sender
-                for sender_id in range(1, distributor.num_profiles + 1):
-                    # gets the number of feeds that the sender has sent in the past day
-                    daily_sender_counter = len(
-                        [
-                            feed
-                            for feed in get_feeds_by_sender(sender_id)
-                            if feed.distributor.timestamp
-                            >= (datetime.now() - timedelta(days=1))
-                        ]
-                    )
-                    # if the sender has sent less than the number of profiles per day, they can send more
-                    if daily_sender_counter < distributor.num_profiles:
-                        # checks to ensure the receiver hasn't already received a feed from the sender
-                        already_received = any(
-                            feed.sender_id == sender_id for feed in r_feeds
-                        )
-                        # if the receiver hasn't already received a feed from the sender and neither has crossed their
-                        # limit, create a feed
-                        if (
-                            (receiver_id != sender_id)
-                            and not already_received
-                            and (sender_id not in senders)
-                        ):
-                            create_feed(sender_id, receiver_id, distributor.id)
-                            senders.append(sender_id)
-                            receivers.append(receiver_id)
-                            break
-
-        # if the number of receivers is less than the number of profiles, there are no more unique feeds to send
-        # therefore repeats must be sent
-        if len(receivers) < distributor.num_profiles:
-            # loops through all the profiles for each receiver
-            for receiver_id in range(1, distributor.num_profiles + 1):
-                # if the receiver hasn't received a feed for this distribution, they can receive one
-                if receiver_id not in receivers:
-                    # gets the number of feeds that the receiver has gotten in the past day
-                    daily_receiver_counter = len(
-                        [
-                            feed
-                            for feed in get_feeds_by_receiver(receiver_id)
-                            if feed.distributor.timestamp
-                            >= (datetime.now() - timedelta(days=1))
-                        ]
-                    )
-                    # if the receiver has gotten less than the number of profiles per day, they can receive more
-                    if daily_receiver_counter < distributor.num_profiles:
-                        # loops through all the profiles for each sender
-                        for sender_id in range(1, distributor.num_profiles + 1):
-                            # gets the number of feeds that the sender has sent in the past day
-                            daily_sender_counter = len(
-                                [
-                                    feed
-                                    for feed in get_feeds_by_sender(sender_id)
-                                    if feed.distributor.timestamp
-                                    >= (datetime.now() - timedelta(days=1))
-                                ]
-                            )
-                            # if the sender has sent less than the number of profiles per day, they can send more and
-                            # the sender and receiver aren't the same profile and the sender hasn't already sent a feed
-                            # to the receiver for this distribution, create a feed
-                            if (
-                                daily_sender_counter < distributor.num_profiles
-                                and sender_id != receiver_id
-                                and sender_id not in senders
-                            ):
-                                create_feed(sender_id, receiver_id, distributor.id)
-                                senders.append(sender_id)
-                                receivers.append(receiver_id)
-                                break
-        # if after both loops, the number of receivers is still less than the number of profiles, there are no more
-        # profiles below the limit and therefore no more feeds can be generated
-        if len(senders) == 0 or len(receivers) == 0:
-            return False
-        return True
+        else:
+            assignments = match_feeds(
+                get_profile_ids(), distributor.num_profiles, sent, received, pairs
+            )
+        create_feeds(assignments, distributor.id, chunk_size)
+        # if no feeds could be made, all profiles are at their limit
+        return len(assignments) > 0
+
+
+def find_distribution_partner(user_id, limit, inbound, day=None):
+    # finds the least loaded profile that can send a feed to the user (inbound) or receive the user's feed;
+    # the day's counters are walked in count order through their index, and when the best of them has
+    # already sent or received something, the newest profiles are checked for one without a counter,
+    # which hasn't; older profiles without a counter are left to the next full round
+    if inbound:
+        partner_count = FeedDailyCounter.sent
+        partner_column, user_column = Feed.sender_id, Feed.receiver_id
+        archived_pairs = select(FeedPair.sender_id).where(
+            FeedPair.receiver_id == user_id
+        )
+    else:
+        partner_count = FeedDailyCounter.received
+        partner_column, user_column = Feed.receiver_id, Feed.sender_id
+        archived_pairs = select(FeedPair.receiver_id).where(
+            FeedPair.sender_id == user_id
+        )
+    day = day or date.today()
+    already_paired = select(partner_column).where(user_column == user_id)
+    partner = (
+        db.session.query(FeedDailyCounter.user_id, partner_count)
+        .filter(
+            FeedDailyCounter.day == day,
+            FeedDailyCounter.user_id != user_id,
+            partner_count < limit,
+            FeedDailyCounter.user_id.notin_(already_paired),
+            FeedDailyCounter.user_id.notin_(archived_pairs),
+        )
+        .order_by(partner_count, FeedDailyCounter.user_id)
+        .first()
+    )
+    if partner and partner[1] == 0:
+        return partner[0]
+    newest = (
+        select(User.id)
+        .order_by(User.id.desc())
+        .limit(DISTRIBUTION_PARTNER_CANDIDATES)
+        .subquery()
+    )
+    counted = (
+        select(FeedDailyCounter.id)
+        .where(FeedDailyCounter.day == day, FeedDailyCounter.user_id == newest.c.id)
+        .exists()
+    )
+    fresh = (
+        db.session.query(newest.c.id)
+        .filter(
+            newest.c.id != user_id,
+            ~counted,
+            newest.c.id.notin_(already_paired),
+            newest.c.id.notin_(archived_pairs),
+        )
+        .order_by(newest.c.id)
+        .first()
+    )
+    if fresh:
+        return fresh[0]
+    if partner:
+        return partner[0]
+    return None
 
 
-def distribute_all():
-    status = distribute()
+def distribute_user(user_id):
+    # only creates the new user's inbound and outbound feeds instead of running a full round
+    distributor = create_distributor()
+    if distributor:
+        limit = distributor.num_profiles
+        counter = get_daily_feed_counter(user_id)
+        assignments = []
+        if not counter or counter.get_received() < limit:
+            sender_id = find_distribution_partner(user_id, limit, True)
+            if sender_id:
+                assignments.append((sender_id, user_id))
+        if not counter or counter.get_sent() < limit:
+            receiver_id = find_distribution_partner(user_id, limit, False)
+            if receiver_id:
+                assignments.append((user_id, receiver_id))
+        create_feeds(assignments, distributor.id)
+        return len(assignments) > 0
+
+
+def distribute_all(chunk_size=None, workers=None):
+    status = distribute(chunk_size, workers)
     counter = 1
     while status:
-        status = distribute()
+        status = distribute(chunk_size, workers)
         counter += 1
     return counter
 
 
-def get_distribution_table():
-    distributors = get_all_distributors()
+def iter_distribution_rows(since=None, seen=None, distributor_id=None, batch_size=1000):
+    # streams the feeds joined to their distributor in batches so memory stays flat on large tables
+    query = db.session.query(
+        Feed.id,
+        Feed.receiver_id,
+        Feed.sender_id,
+        Feed.distributor_id,
+        Feed.seen,
+        Distributor.timestamp,
+    ).join(Distributor, Feed.distributor_id == Distributor.id)
+    if since:
+        query = query.filter(Distributor.timestamp >= since)
+    if seen is not None:
+        query = query.filter(Feed.seen == seen)
+    if distributor_id:
+        query = query.filter(Feed.distributor_id == distributor_id)
+    return query.order_by(Feed.id).yield_per(batch_size)
+
+
+def export_distribution(
+    format="csv", since=None, seen=None, distributor_id=None, batch_size=1000
+):
+    # yields the distribution table as csv or jsonl text, one chunk per batch of rows
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if format == "csv":
+        writer.writerow(DISTRIBUTION_COLUMNS)
+    rows = iter_distribution_rows(since, seen, distributor_id, batch_size)
+    for count, row in enumerate(rows, 1):
+        row = list(row)
+        row[-1] = row[-1].isoformat() if row[-1] else None
+        if format == "csv":
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(DISTRIBUTION_COLUMNS, row))) + "\n")
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def get_distribution_table(seen=None):
     table = {0: {"FEED ID", "RECEIVER", "SENDER", "DISTRIBUTOR", "SEEN"}}
-    for distributor in distributors:
-        for feed in distributor.feed:
-            table[feed.id] = {
-                feed.id,
-                feed.receiver_id,
-                feed.sender_id,
-                feed.distributor_id,
-                feed.seen,
-            }
+    for row in iter_distribution_rows(seen=seen):
+        table[row.id] = {
+            row.id,
+            row.receiver_id,
+            row.sender_id,
+            row.distributor_id,
+            row.seen,
+        }
     return table
 
 
 def get_unseen_distribution_table():
-    distributors = get_all_distributors()
-    table = {0: {"FEED ID", "RECEIVER", "SENDER", "DISTRIBUTOR", "SEEN"}}
-    for distributor in distributors:
-        for feed in distributor.feed:
-            if not feed.seen:
-                table[feed.id] = {
-                    feed.id,
-                    feed.receiver_id,
-                    feed.sender_id,
-                    feed.distributor_id,
-                    feed.seen,
-                }
-    return table
+    return get_distribution_table(seen=False)
 
 
 def get_seen_distribution_table():
-    distributors = get_all_distributors()
-    table = {0: {"FEED ID", "RECEIVER", "SENDER", "DISTRIBUTOR", "SEEN"}}
-    for distributor in distributors:
-        for feed in distributor.feed:
-            if feed.seen:
-                table[feed.id] = {
-                    feed.id,
-                    feed.receiver_id,
-                    feed.sender_id,
-                    feed.distributor_id,
-                    feed.seen,
-                }
-    return table
+    return get_distribution_table(seen=True)
@@ -1,6 +1,10 @@
 from App.models import Feed
 from App.database import db
-from App.controllers.user import get_user
+from App.controllers.user import get_user, get_existing_user_ids, get_user_profiles
+from App.controllers.feed_counter import add_daily_feed_counts
+from App.controllers.pair_index import record_feed_pairs, reset_pair_index
+from App.controllers.feed_events import notify_feed_receivers
+from App.controllers.revision import bump_revisions, feeds_resource
 
 
 def create_feed(sender_id, receiver_id, distributor_id):
@@ -9,11 +13,48 @@ def create_feed(sender_id, receiver_id, distributor_id):
     if sender and receiver:
         feed = Feed(sender_id, receiver_id, distributor_id)
         db.session.add(feed)
+        add_daily_feed_counts([(sender_id, receiver_id)])
+        bump_revisions([feeds_resource(receiver_id)])
         db.session.commit()
+        record_feed_pairs([(sender_id, receiver_id)])
+        notify_feed_receivers([receiver_id])
         return feed
     return None
 
 
+def create_feeds(pairs, distributor_id, chunk_size=None):
+    # validates every user id with one query and inserts the feeds with executemany,
+    # committing once or once per chunk together with the daily counters
+    pairs = list(pairs)
+    valid_ids = get_existing_user_ids(user_id for pair in pairs for user_id in pair)
+    pairs = [
+        (sender_id, receiver_id)
+        for sender_id, receiver_id in pairs
+        if sender_id in valid_ids and receiver_id in valid_ids
+    ]
+    chunk_size = chunk_size or len(pairs) or 1
+    for i in range(0, len(pairs), chunk_size):
+        chunk = pairs[i : i + chunk_size]
+        db.session.execute(
+            Feed.__table__.insert(),
+            [
+                {
+                    "sender_id": sender_id,
+                    "receiver_id": receiver_id,
+                    "distributor_id": distributor_id,
+                    "seen": False,
+                }
+                for sender_id, receiver_id in chunk
+            ],
+        )
+        add_daily_feed_counts(chunk)
+        bump_revisions(feeds_resource(receiver_id) for _, receiver_id in chunk)
+        db.session.commit()
+        record_feed_pairs(chunk)
+        notify_feed_receivers(receiver_id for _, receiver_id in chunk)
+    return len(pairs)
+
+
 def get_feed(id):
     feed = Feed.query.get(id)
     return feed
@@ -54,19 +95,94 @@ def get_feeds_by_receiver_json(receiver_id):
     return [feed.to_json() for feed in feeds]
 
 
+def get_feeds_page(column, user_id, limit=20, after=None, seen=None):
+    # newest first with a keyset on Feed.id: after is the next_cursor of the previous page
+    query = Feed.query.filter(column == user_id)
+    if after:
+        query = query.filter(Feed.id < after)
+    if seen is not None:
+        query = query.filter(Feed.seen == seen)
+    feeds = query.order_by(Feed.id.desc()).limit(limit + 1).all()
+    next_cursor = feeds[limit - 1].id if len(feeds) > limit else None
+    return feeds[:limit], next_cursor
+
+
+def get_feeds_page_json(column, user_id, limit=20, after=None, seen=None):
+    feeds, next_cursor = get_feeds_page(column, user_id, limit, after, seen)
+    return {"feeds": [feed.to_json() for feed in feeds], "next_cursor": next_cursor}
+
+
+def get_feeds_by_sender_page_json(sender_id, limit=20, after=None, seen=None):
+    return get_feeds_page_json(Feed.sender_id, sender_id, limit, after, seen)
+
+
+def get_feeds_by_receiver_page_json(receiver_id, limit=20, after=None, seen=None):
+    return get_feeds_page_json(Feed.receiver_id, receiver_id, limit, after, seen)
+
+
+def expand_feed_senders(feeds):
+    # adds each sender's profile to serialized feeds, with the same number of queries for any page size
+    profiles = get_user_profiles(feed["sender_id"] for feed in feeds)
+    for feed in feeds:
+        feed["sender"] = profiles.get(feed["sender_id"])
+    return feeds
+
+
+def get_unseen_feed_count(receiver_id):
+    # answered from the (receiver_id, seen, id) index without reading the feed rows
+    return (
+        db.session.query(db.func.count(Feed.id))
+        .filter(Feed.receiver_id == receiver_id, Feed.seen == False)
+        .scalar()
+    )
+
+
 def view_feed(id):
     feed = Feed.query.get(id)
     if feed:
         feed.set_seen()
+        bump_revisions([feeds_resource(feed.receiver_id)])
         db.session.commit()
         return feed
     return None
 
 
+def view_feeds(ids=None, receiver_id=None, up_to=None):
+    # marks feeds as seen with a single UPDATE, either by id or every feed of the receiver up to a cursor
+    if ids is None and receiver_id is None:
+        return 0
+    query = Feed.query.filter(Feed.seen == False)
+    if ids is not None:
+        query = query.filter(Feed.id.in_(ids))
+    if receiver_id is not None:
+        query = query.filter(Feed.receiver_id == receiver_id)
+    if up_to is not None:
+        query = query.filter(Feed.id <= up_to)
+    receiver_ids = [receiver_id]
+    if receiver_id is None:
+        # feeds picked by id can belong to several receivers
+        receiver_ids = [
+            id for (id,) in query.with_entities(Feed.receiver_id).distinct()
+        ]
+    count = query.update({"seen": True}, synchronize_session=False)
+    if count:
+        bump_revisions(feeds_resource(receiver_id) for receiver_id in receiver_ids)
+    db.session.commit()
+    return count
+
+
 def delete_feed(id):
     feed = Feed.query.get(id)
     if feed:
+        if feed.distributor:
+            add_daily_feed_counts(
+                [(feed.sender_id, feed.receiver_id)],
+                feed.distributor.timestamp.date(),
+                -1,
+            )
         db.session.delete(feed)
+        bump_revisions([feeds_resource(feed.receiver_id)])
         db.session.commit()
+        reset_pair_index()
         return True
     return False
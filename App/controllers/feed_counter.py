@@ -0,0 +1,127 @@
+from collections import Counter
+from datetime import date
+from sqlalchemy import bindparam, func
+from App.models import Distributor, Feed, FeedDailyCounter
+from App.database import db, upsert
+
+# increments in SQL so concurrent writers don't overwrite each other
+counters = FeedDailyCounter.__table__
+increment_daily_feed_counter = (
+    counters.update()
+    .where(counters.c.user_id == bindparam("b_user_id"))
+    .where(counters.c.day == bindparam("b_day"))
+    .values(
+        sent=counters.c.sent + bindparam("b_sent"),
+        received=counters.c.received + bindparam("b_received"),
+    )
+)
+
+
+def get_daily_feed_counter(user_id, day=None):
+    return FeedDailyCounter.query.filter_by(
+        user_id=user_id, day=day or date.today()
+    ).first()
+
+
+def get_daily_sent_count(user_id, day=None):
+    counter = get_daily_feed_counter(user_id, day)
+    if counter:
+        return counter.get_sent()
+    return 0
+
+
+def get_daily_received_count(user_id, day=None):
+    counter = get_daily_feed_counter(user_id, day)
+    if counter:
+        return counter.get_received()
+    return 0
+
+
+def get_daily_feed_counts(day=None):
+    # loads every user's counters for the day with one indexed query
+    sent = Counter()
+    received = Counter()
+    rows = db.session.query(
+        FeedDailyCounter.user_id, FeedDailyCounter.sent, FeedDailyCounter.received
+    ).filter(FeedDailyCounter.day == (day or date.today()))
+    for user_id, user_sent, user_received in rows:
+        sent[user_id] = user_sent
+        received[user_id] = user_received
+    return sent, received
+
+
+def add_daily_feed_counts(pairs, day=None, delta=1, batch_size=500):
+    # adds the (sender, receiver) pairs to the day's counters in the caller's transaction;
+    # new counts are upserted so concurrent writers can't both insert the same counter,
+    # removed ones only ever update an existing counter
+    day = day or date.today()
+    sent = Counter(sender_id for sender_id, receiver_id in pairs)
+    received = Counter(receiver_id for sender_id, receiver_id in pairs)
+    # a fixed order keeps concurrent writers from locking the same counters in opposite order
+    user_ids = sorted(set(sent) | set(received))
+    statement = upsert(counters)
+    upsert_counter = statement.on_conflict_do_update(
+        index_elements=["day", "user_id"],
+        set_={
+            "sent": counters.c.sent + statement.excluded.sent,
+            "received": counters.c.received + statement.excluded.received,
+        },
+    )
+    for i in range(0, len(user_ids), batch_size):
+        batch = user_ids[i : i + batch_size]
+        if delta > 0:
+            db.session.execute(
+                upsert_counter,
+                [
+                    {
+                        "user_id": user_id,
+                        "day": day,
+                        "sent": delta * sent[user_id],
+                        "received": delta * received[user_id],
+                    }
+                    for user_id in batch
+                ],
+            )
+        else:
+            db.session.execute(
+                increment_daily_feed_counter,
+                [
+                    {
+                        "b_user_id": user_id,
+                        "b_day": day,
+                        "b_sent": delta * sent[user_id],
+                        "b_received": delta * received[user_id],
+                    }
+                    for user_id in batch
+                ],
+            )
+
+
+def rebuild_daily_feed_counters():
+    # back-fills the counters from the existing Feed and Distributor rows
+    day = func.date(Distributor.timestamp, type_=db.Date)
+    counts = {}
+    for column, index in ((Feed.sender_id, 0), (Feed.receiver_id, 1)):
+        rows = (
+            db.session.query(column, day, func.count(Feed.id))
+            .join(Distributor, Feed.distributor_id == Distributor.id)
+            .group_by(column, day)
+        )
+        for user_id, feed_day, count in rows:
+            counts.setdefault((user_id, feed_day), [0, 0])[index] = count
+    FeedDailyCounter.query.delete()
+    if counts:
+        db.session.execute(
+            FeedDailyCounter.__table__.insert(),
+            [
+                {
+                    "user_id": user_id,
+                    "day": feed_day,
+                    "sent": sent,
+                    "received": received,
+                }
+                for (user_id, feed_day), (sent, received) in counts.items()
+            ],
+        )
+    db.session.commit()
+    return len(counts)
@@ -0,0 +1,90 @@
+import json, queue, threading
+from App.models import Feed
+from App.database import db
+
+FEED_EVENT_BATCH = 100
+
+# receiver id -> queues of the streams open for that receiver in this process
+feed_subscribers = {}
+feed_subscribers_lock = threading.Lock()
+
+
+def subscribe_feeds(receiver_id):
+    # a queue of size one is enough: a pending wake-up already means "check for new feeds"
+    subscription = queue.Queue(maxsize=1)
+    with feed_subscribers_lock:
+        feed_subscribers.setdefault(receiver_id, set()).add(subscription)
+    return subscription
+
+
+def unsubscribe_feeds(receiver_id, subscription):
+    with feed_subscribers_lock:
+        subscriptions = feed_subscribers.get(receiver_id)
+        if subscriptions:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del feed_subscribers[receiver_id]
+
+
+def notify_feed_receivers(receiver_ids):
+    with feed_subscribers_lock:
+        subscriptions = [
+            subscription
+            for receiver_id in set(receiver_ids)
+            for subscription in feed_subscribers.get(receiver_id, ())
+        ]
+    for subscription in subscriptions:
+        try:
+            subscription.put_nowait(True)
+        except queue.Full:
+            pass
+
+
+def get_feeds_by_receiver_after(receiver_id, after, limit=FEED_EVENT_BATCH):
+    return (
+        Feed.query.filter(Feed.receiver_id == receiver_id, Feed.id > after)
+        .order_by(Feed.id)
+        .limit(limit)
+        .all()
+    )
+
+
+def get_last_feed_id(receiver_id):
+    return (
+        db.session.query(db.func.max(Feed.id))
+        .filter(Feed.receiver_id == receiver_id)
+        .scalar()
+        or 0
+    )
+
+
+def stream_feeds(receiver_id, last_event_id=None, heartbeat=15):
+    # yields server-sent events for the receiver's new feeds, resuming after last_event_id;
+    # the database is only read when a feed was created for the receiver or on a heartbeat,
+    # which also picks up feeds created by other processes
+    subscription = subscribe_feeds(receiver_id)
+    try:
+        last_id = last_event_id
+        if last_id is None:
+            last_id = get_last_feed_id(receiver_id)
+        yield f"retry: {int(heartbeat * 1000)}\n\n"
+        while True:
+            feeds = [
+                feed.to_json()
+                for feed in get_feeds_by_receiver_after(
+                    receiver_id, last_id, FEED_EVENT_BATCH
+                )
+            ]
+            # ends the read transaction so the connection goes back to the pool while the stream waits
+            db.session.commit()
+            for feed in feeds:
+                last_id = feed["id"]
+                yield f"id: {feed['id']}\nevent: feed\ndata: {json.dumps(feed)}\n\n"
+            if len(feeds) == FEED_EVENT_BATCH:
+                continue
+            try:
+                subscription.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ": heartbeat\n\n"
+    finally:
+        unsubscribe_feeds(receiver_id, subscription)
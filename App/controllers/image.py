@@ -1,13 +1,26 @@
-from App.models import Image
-from App.controllers import get_user
+from datetime import datetime
+from App.models import Image, Ranking
+from App.controllers import (
+    get_user,
+    bump_revisions,
+    images_resource,
+    USERS_RESOURCE,
+    average_rank,
+    ranked_sum,
+    ranked_count,
+    recompute_image_ranks,
+)
 from App.database import db
 
+IMAGE_SORTS = ("recent", "rank")
+
 
 def create_image(user_id, url):
     user = get_user(user_id)
     if user:
         image = Image(user_id, url)
         db.session.add(image)
+        bump_revisions([USERS_RESOURCE, images_resource(user_id)])
         db.session.commit()
         return image
     return None
@@ -18,6 +31,12 @@ def get_image(id):
     return image
 
 
+def get_image_for_update(id):
+    # locks the image row until the commit, so concurrent rankings of it take turns
+    # and each sees the rankings committed before it
+    return Image.query.with_for_update().get(id)
+
+
 def get_image_json(id):
     image = Image.query.get(id)
     if image:
@@ -45,6 +64,59 @@ def get_images_by_user_json(user_id):
     return [image.to_json() for image in images]
 
 
+def get_images_page(user_id=None, sort="recent", limit=20, page=1):
+    # one query per page, newest first or highest average rank first
+    query = Image.query
+    if user_id is not None:
+        query = query.filter(Image.user_id == user_id)
+    if sort == "rank":
+        query = query.order_by(Image.avg_rank.desc(), Image.id.desc())
+    else:
+        query = query.order_by(Image.id.desc())
+    images = query.offset((page - 1) * limit).limit(limit + 1).all()
+    next_page = page + 1 if len(images) > limit else None
+    return images[:limit], next_page
+
+
+def get_images_page_json(user_id=None, sort="recent", limit=20, page=1):
+    images, next_page = get_images_page(user_id, sort, limit, page)
+    return {"images": [image.to_json() for image in images], "next_page": next_page}
+
+
+def get_top_images(limit=10, window=None):
+    # (image, average rank, rankings) best first; all-time reads walk the avg_rank index,
+    # a window averages only the rankings given within it, found through ranked_at
+    if window is None:
+        images = (
+            Image.query.filter(Image.rank_count > 0)
+            .order_by(Image.avg_rank.desc(), Image.id.desc())
+            .limit(limit)
+            .all()
+        )
+        return [(image, image.avg_rank, image.rank_count) for image in images]
+    window_rank = db.func.avg(Ranking.rank)
+    return (
+        db.session.query(Image, window_rank, db.func.count(Ranking.id))
+        .join(Ranking, Ranking.image_id == Image.id)
+        .filter(Ranking.ranked_at >= datetime.now() - window)
+        .group_by(Image.id)
+        .order_by(window_rank.desc(), Image.id.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def get_top_images_json(limit=10, window=None):
+    top = []
+    for image, average, count in get_top_images(limit, window):
+        image_json = image.to_json()
+        image_json["average_rank"] = average
+        if window:
+            image_json["window_rankings"] = count
+        top.append(image_json)
+    return top
+
+
 def get_average_image_rank(image_id):
     image = get_image(image_id)
     if image:
@@ -64,10 +136,32 @@ def get_image_rankings_json(image_id):
     return [ranking.to_json() for ranking in rankings]
 
 
+def recompute_image_aggregates(batch_size=500):
+    # recomputes the rank totals of the images that drifted from their rankings and
+    # returns how many there were
+    drifted = (
+        db.session.query(Image.id, Image.user_id)
+        .filter(
+            (Image.rank_sum != ranked_sum)
+            | (Image.rank_count != ranked_count)
+            | (Image.avg_rank != average_rank(Image.rank_sum, Image.rank_count))
+        )
+        .all()
+    )
+    recompute_image_ranks((image_id for image_id, _ in drifted), batch_size)
+    if drifted:
+        bump_revisions(
+            [USERS_RESOURCE] + [images_resource(user_id) for _, user_id in drifted]
+        )
+    db.session.commit()
+    return len(drifted)
+
+
 def delete_image(id):
     image = get_image(id)
     if image:
         db.session.delete(image)
+        bump_revisions([USERS_RESOURCE, images_resource(image.get_user_id())])
         db.session.commit()
         return True
     return False
@@ -0,0 +1,35 @@
+from App.models import Image, Ranking
+from App.database import db
+
+
+def average_rank(rank_sum, rank_count):
+    # sql average of rank totals, 0 for unranked images like Image.get_average_rank
+    return db.case((rank_count > 0, rank_sum * 1.0 / rank_count), else_=0)
+
+
+# the totals of an image's rankings, correlated to the image being updated or filtered
+ranked_sum = db.func.coalesce(
+    db.select(db.func.sum(Ranking.rank))
+    .where(Ranking.image_id == Image.id)
+    .scalar_subquery(),
+    0,
+)
+ranked_count = (
+    db.select(db.func.count(Ranking.id))
+    .where(Ranking.image_id == Image.id)
+    .scalar_subquery()
+)
+
+
+def recompute_image_ranks(image_ids, batch_size=500):
+    # sets the rank totals of the images from their rankings in SQL, in the caller's transaction
+    image_ids = list(image_ids)
+    for i in range(0, len(image_ids), batch_size):
+        Image.query.filter(Image.id.in_(image_ids[i : i + batch_size])).update(
+            {
+                Image.rank_sum: ranked_sum,
+                Image.rank_count: ranked_count,
+                Image.avg_rank: average_rank(ranked_sum, ranked_count),
+            },
+            synchronize_session=False,
+        )
@@ -0,0 +1,137 @@
+import threading
+from array import array
+from bisect import bisect_left
+from App.models import Feed, FeedPair
+from App.database import db
+
+
+class PairIndex:
+    # sender history per receiver as sorted arrays of sender ids, 4 bytes per pair,
+    # so "has this receiver already gotten this sender" is a binary search instead of a list scan
+    def __init__(self, pairs=()):
+        self.senders = {}
+        self.url = None
+        self.last_feed_id = 0
+        for sender_id, receiver_id in pairs:
+            self.add(sender_id, receiver_id)
+
+    def add(self, sender_id, receiver_id):
+        senders = self.senders.get(receiver_id)
+        if senders is None:
+            senders = self.senders[receiver_id] = array("i")
+        i = bisect_left(senders, sender_id)
+        if i == len(senders) or senders[i] != sender_id:
+            senders.insert(i, sender_id)
+
+    def with_pairs(self, pairs):
+        # a copy with the pairs added; only the arrays of receivers that get a new sender
+        # are copied, so anyone still reading this index never sees it change
+        index = PairIndex()
+        index.senders = dict(self.senders)
+        index.url = self.url
+        index.last_feed_id = self.last_feed_id
+        copied = set()
+        for sender_id, receiver_id in pairs:
+            if (sender_id, receiver_id) in index:
+                continue
+            if receiver_id not in copied and receiver_id in index.senders:
+                index.senders[receiver_id] = array("i", index.senders[receiver_id])
+            copied.add(receiver_id)
+            index.add(sender_id, receiver_id)
+        return index
+
+    def subset(self, receiver_ids):
+        index = PairIndex()
+        for receiver_id in receiver_ids:
+            if receiver_id in self.senders:
+                index.senders[receiver_id] = self.senders[receiver_id]
+        return index
+
+    def __contains__(self, pair):
+        sender_id, receiver_id = pair
+        senders = self.senders.get(receiver_id)
+        if not senders:
+            return False
+        i = bisect_left(senders, sender_id)
+        return i < len(senders) and senders[i] == sender_id
+
+    def __iter__(self):
+        for receiver_id, senders in self.senders.items():
+            for sender_id in senders:
+                yield sender_id, receiver_id
+
+    def __len__(self):
+        return sum(len(senders) for senders in self.senders.values())
+
+
+# one index per process, built on first use and rebuilt when the database changes;
+# updates swap in a new index instead of changing the one a round may be reading
+current_pair_index = None
+pair_index_lock = threading.Lock()
+
+# feeds are numbered when inserted but can commit out of order, so every refresh
+# reads this many ids below the last one seen again
+FEED_ID_OVERLAP = 10000
+
+
+def get_last_feed_id():
+    return db.session.query(db.func.max(Feed.id)).scalar() or 0
+
+
+def build_pair_index():
+    index = PairIndex()
+    # pairs are read up to the last id seen here, anything after it comes with a refresh
+    last_feed_id = get_last_feed_id()
+    live = db.session.query(Feed.receiver_id, Feed.sender_id).filter(
+        Feed.id <= last_feed_id
+    )
+    # pairs of archived feeds still count as sent
+    archived = db.session.query(FeedPair.receiver_id, FeedPair.sender_id)
+    rows = live.union(archived).order_by(Feed.receiver_id, Feed.sender_id)
+    # rows arrive sorted, so each receiver's array can be appended to directly
+    for receiver_id, sender_id in rows:
+        senders = index.senders.get(receiver_id)
+        if senders is None:
+            senders = index.senders[receiver_id] = array("i")
+        senders.append(sender_id)
+    index.url = str(db.engine.url)
+    index.last_feed_id = last_feed_id
+    return index
+
+
+def refresh_pair_index(index):
+    # picks up feeds written by other processes since the index was last refreshed,
+    # including ones that committed after feeds with higher ids
+    last_feed_id = get_last_feed_id()
+    rows = db.session.query(Feed.sender_id, Feed.receiver_id).filter(
+        Feed.id > index.last_feed_id - FEED_ID_OVERLAP, Feed.id <= last_feed_id
+    )
+    index = index.with_pairs(rows)
+    index.last_feed_id = max(index.last_feed_id, last_feed_id)
+    return index
+
+
+def get_pair_index():
+    global current_pair_index
+    with pair_index_lock:
+        if current_pair_index is None or current_pair_index.url != str(db.engine.url):
+            current_pair_index = build_pair_index()
+        else:
+            current_pair_index = refresh_pair_index(current_pair_index)
+        return current_pair_index
+
+
+def record_feed_pairs(pairs):
+    global current_pair_index
+    with pair_index_lock:
+        if current_pair_index is not None and current_pair_index.url == str(
+            db.engine.url
+        ):
+            current_pair_index = current_pair_index.with_pairs(pairs)
+
+
+def reset_pair_index():
+    # deleted feeds can make a pair available again, so the index is rebuilt on next use
+    global current_pair_index
+    with pair_index_lock:
+        current_pair_index = None
@@ -0,0 +1,15 @@
+from App.controllers.distributor import (
+    get_profile_ids,
+    load_distribution_state,
+    match_feeds,
+)
+
+
+def plan_distribution(limit=None, day=None):
+    # computes the feeds the next distribution round would create without writing anything,
+    # with the same matcher the round itself uses
+    profile_ids = get_profile_ids()
+    if len(profile_ids) <= 2:
+        return []
+    sent, received, pairs = load_distribution_state(day)
+    return match_feeds(profile_ids, limit or len(profile_ids), sent, received, pairs)
@@ -1,24 +1,185 @@
-from App.models import Ranking
-from App.controllers import get_user, get_image
-from App.database import db
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import bindparam
+from App.models import Ranking, Image
+from App.controllers import (
+    get_user,
+    get_existing_user_ids,
+    get_image,
+    get_image_for_update,
+    average_rank,
+    recompute_image_aggregates,
+    bump_revisions,
+    images_resource,
+    USERS_RESOURCE,
+)
+from App.database import db, upsert, delete_duplicates
+
+# adjusts the running totals in SQL; the right-hand sides all see the old row,
+# so the average is taken of the new totals
+images = Image.__table__
+new_rank_sum = images.c.rank_sum + bindparam("b_rank")
+new_rank_count = images.c.rank_count + bindparam("b_count")
+increment_image_rank = (
+    images.update()
+    .where(images.c.id == bindparam("b_image_id"))
+    .values(
+        rank_sum=new_rank_sum,
+        rank_count=new_rank_count,
+        avg_rank=average_rank(new_rank_sum, new_rank_count),
+    )
+)
 
 
 def create_ranking(ranker_id, image_id, rank):
     ranker = get_user(ranker_id)
-    image = get_image(image_id)
+    image = get_image_for_update(image_id)
     if ranker and image:
-        ranking = Ranking(ranker_id, image_id, rank)
-        db.session.add(ranking)
+        # ranking an image again replaces the ranker's previous rank, read under the image lock
+        # so a concurrent double submit can't count the ranking twice
+        previous = (
+            db.session.query(Ranking.rank)
+            .filter_by(ranker_id=ranker_id, image_id=image_id)
+            .scalar()
+        )
+        statement = upsert(Ranking.__table__).values(
+            ranker_id=ranker_id, image_id=image_id, rank=rank, ranked_at=datetime.now()
+        )
+        db.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=["ranker_id", "image_id"],
+                set_={
+                    "rank": statement.excluded.rank,
+                    "ranked_at": statement.excluded.ranked_at,
+                },
+            )
+        )
+        if previous is None:
+            add_image_rank(image_id, rank, 1)
+        else:
+            add_image_rank(image_id, rank - previous, 0)
+        bump_revisions([USERS_RESOURCE, images_resource(image.get_user_id())])
         db.session.commit()
-        return ranking
+        return get_ranking_by_ranker_and_image(ranker_id, image_id)
     return None
 
 
+def add_image_rank(image_id, rank, count):
+    add_image_ranks({image_id: rank}, {image_id: count})
+
+
+def add_image_ranks(ranks, counts):
+    # adjusts the totals of every image in ranks with one executemany, in the caller's transaction
+    db.session.execute(
+        increment_image_rank,
+        [
+            {
+                "b_image_id": image_id,
+                "b_rank": ranks[image_id],
+                "b_count": counts[image_id],
+            }
+            for image_id in ranks
+        ],
+    )
+
+
+def is_ranking_item(item):
+    # bool is an int subclass, so a true or false rank isn't taken as 1 or 0
+    return isinstance(item, dict) and all(
+        type(item.get(key)) is int for key in ("ranker_id", "image_id", "rank")
+    )
+
+
+def create_rankings(items):
+    # validates every ranker and image with one IN query each, upserts the valid rankings
+    # and updates each ranked image's totals once, all in one transaction; returns one
+    # result per item in order
+    valid_items = [item for item in items if is_ranking_item(item)]
+    ranker_ids = get_existing_user_ids(item["ranker_id"] for item in valid_items)
+    # the images are locked in id order, as get_image_for_update does for a single ranking
+    owners = dict(
+        db.session.query(Image.id, Image.user_id)
+        .filter(Image.id.in_({item["image_id"] for item in valid_items}))
+        .order_by(Image.id)
+        .with_for_update()
+    )
+    # items for an existing ranking, or repeated within the batch, replace its rank
+    rankings = {
+        (ranking.ranker_id, ranking.image_id): ranking
+        for ranking in Ranking.query.filter(
+            Ranking.ranker_id.in_(ranker_ids), Ranking.image_id.in_(owners)
+        )
+    }
+    ranks = Counter()
+    counts = Counter()
+    results = []
+    for item in items:
+        if not is_ranking_item(item):
+            results.append({"error": "ranker_id, image_id and rank must be integers"})
+        elif item["ranker_id"] not in ranker_ids:
+            results.append({"error": "Ranker does not exist"})
+        elif item["image_id"] not in owners:
+            results.append({"error": "Image does not exist"})
+        else:
+            key = (item["ranker_id"], item["image_id"])
+            ranking = rankings.get(key)
+            if ranking:
+                ranks[ranking.image_id] += item["rank"] - ranking.rank
+                ranking.rank = item["rank"]
+                ranking.ranked_at = datetime.now()
+            else:
+                ranking = rankings[key] = Ranking(*key, item["rank"])
+                db.session.add(ranking)
+                ranks[ranking.image_id] += ranking.rank
+                counts[ranking.image_id] += 1
+            results.append({"ranking": ranking})
+    if ranks:
+        db.session.flush()
+        add_image_ranks(ranks, counts)
+        bump_revisions(
+            [USERS_RESOURCE] + [images_resource(owners[image_id]) for image_id in ranks]
+        )
+    # serialized before the commit expires the rankings
+    for result in results:
+        if "ranking" in result:
+            result["ranking"] = result["ranking"].to_json()
+    db.session.commit()
+    return results
+
+
+def dedupe_rankings(batch_size=500):
+    # keeps each ranker's latest ranking of an image, then fixes the image totals
+    deleted = delete_duplicates(
+        Ranking.__table__, ["ranker_id", "image_id"], batch_size
+    )
+    recompute_image_aggregates(batch_size)
+    return deleted
+
+
+def bump_ranking_revisions(ranking):
+    # rankings show up in the user listing and in the ranked image's average
+    image = get_image(ranking.image_id)
+    bump_revisions([USERS_RESOURCE, images_resource(image.get_user_id())])
+
+
 def get_ranking(id):
     ranking = Ranking.query.get(id)
     return ranking
 
 
+def get_ranking_by_ranker_and_image(ranker_id, image_id):
+    return Ranking.query.filter_by(ranker_id=ranker_id, image_id=image_id).first()
+
+
+def get_ranking_for_update(id):
+    # locks the ranked image first, like create_ranking, then reads the ranking under the lock
+    ranking = Ranking.query.get(id)
+    if ranking:
+        get_image_for_update(ranking.image_id)
+        return Ranking.query.populate_existing().get(id)
+    return None
+
+
 def get_ranking_json(id):
     ranking = Ranking.query.get(id)
     return ranking.to_json()
@@ -55,18 +216,23 @@ def get_rankings_by_image_json(image_id):
 
 
 def update_ranking(id, rank):
-    ranking = Ranking.query.get(id)
+    ranking = get_ranking_for_update(id)
     if ranking:
+        add_image_rank(ranking.image_id, rank - ranking.rank, 0)
         ranking.rank = rank
+        ranking.ranked_at = datetime.now()
+        bump_ranking_revisions(ranking)
         db.session.commit()
         return ranking
     return None
 
 
 def delete_ranking(id):
-    ranking = Ranking.query.get(id)
+    ranking = get_ranking_for_update(id)
     if ranking:
         db.session.delete(ranking)
+        add_image_rank(ranking.image_id, -ranking.rank, -1)
+        bump_ranking_revisions(ranking)
         db.session.commit()
         return True
     return False
@@ -1,16 +1,40 @@
 from App.models import Rating
-from App.controllers import get_user
-from App.database import db
+from App.controllers import (
+    get_user,
+    get_user_for_update,
+    bump_revisions,
+    ratings_resource,
+    adjust_user_rating_stats,
+    get_average_ratings,
+    rebuild_user_rating_stats,
+)
+from App.database import db, upsert, delete_duplicates
 
 
 def create_rating(rater_id, rated_id, rating):
     rater = get_user(rater_id)
-    rated = get_user(rated_id)
+    rated = get_user_for_update(rated_id)
     if rater and rated:
-        rating = Rating(rater_id, rated_id, rating)
-        db.session.add(rating)
+        # rating a user again replaces the rater's previous rating, read under the rated
+        # user's lock so a concurrent double submit can't count the rating twice
+        previous = (
+            db.session.query(Rating.rating)
+            .filter_by(rater_id=rater_id, rated_id=rated_id)
+            .scalar()
+        )
+        statement = upsert(Rating.__table__).values(
+            rater_id=rater_id, rated_id=rated_id, rating=rating
+        )
+        db.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=["rater_id", "rated_id"],
+                set_={"rating": statement.excluded.rating},
+            )
+        )
+        adjust_user_rating_stats(rated_id, previous, rating)
+        bump_revisions([ratings_resource(rated_id)])
         db.session.commit()
-        return rating
+        return get_rating_by_rater_and_rated(rater_id, rated_id)
     return None
 
 
@@ -19,6 +43,19 @@ def get_rating(id):
     return rating
 
 
+def get_rating_for_update(id):
+    # locks the rated user first, like create_rating, then reads the rating under the lock
+    rating = Rating.query.get(id)
+    if rating:
+        get_user_for_update(rating.get_rated_id())
+        return Rating.query.populate_existing().get(id)
+    return None
+
+
+def get_rating_by_rater_and_rated(rater_id, rated_id):
+    return Rating.query.filter_by(rater_id=rater_id, rated_id=rated_id).first()
+
+
 def get_rating_json(id):
     rating = Rating.query.get(id)
     return rating.to_json()
@@ -55,28 +92,40 @@ def get_ratings_by_rated_json(rated_id):
 
 
 def get_average_rating_by_rated(rated_id):
-    ratings = Rating.query.filter_by(rated_id=rated_id).all()
-    if ratings:
-        total = 0
-        for rating in ratings:
-            total += rating.get_rating()
-        return round(total / len(ratings))
-    return None
+    return get_average_ratings([rated_id]).get(rated_id)
+
+
+def dedupe_ratings(batch_size=500):
+    # keeps each rater's latest rating of a user
+    deleted = delete_duplicates(Rating.__table__, ["rater_id", "rated_id"], batch_size)
+    if deleted:
+        bump_revisions(
+            ratings_resource(rated_id)
+            for (rated_id,) in db.session.query(Rating.rated_id).distinct()
+        )
+        rebuild_user_rating_stats()
+    return deleted
 
 
 def update_rating(id, new_rating):
-    rating = Rating.query.get(id)
+    rating = get_rating_for_update(id)
     if rating:
+        previous = rating.get_rating()
+        # set first, a user without stats has them built from the flushed ratings
         rating.set_rating(new_rating)
+        adjust_user_rating_stats(rating.get_rated_id(), previous, new_rating)
+        bump_revisions([ratings_resource(rating.get_rated_id())])
         db.session.commit()
         return rating
     return None
 
 
 def delete_rating(id):
-    rating = Rating.query.get(id)
+    rating = get_rating_for_update(id)
     if rating:
         db.session.delete(rating)
+        adjust_user_rating_stats(rating.get_rated_id(), rating.get_rating())
+        bump_revisions([ratings_resource(rating.get_rated_id())])
         db.session.commit()
         return True
     return False
@@ -0,0 +1,100 @@
+from sqlalchemy import func
+from App.models import Rating, UserRatingStats, RATING_BUCKETS
+from App.database import db
+
+stats = UserRatingStats.__table__
+
+
+def new_rating_stats(user_id):
+    row = {"user_id": user_id, "rating_sum": 0, "rating_count": 0}
+    row.update((f"count_{rating}", 0) for rating in RATING_BUCKETS)
+    return row
+
+
+def build_rating_stats(user_ids=None):
+    # stats rows computed from the ratings of the users, or of every rated user,
+    # with one grouped query; users without ratings get zeros
+    rows = {user_id: new_rating_stats(user_id) for user_id in user_ids or ()}
+    query = db.session.query(
+        Rating.rated_id, Rating.rating, func.count(Rating.id)
+    ).group_by(Rating.rated_id, Rating.rating)
+    if user_ids is not None:
+        query = query.filter(Rating.rated_id.in_(user_ids))
+    for rated_id, rating, count in query:
+        row = rows.setdefault(rated_id, new_rating_stats(rated_id))
+        row["rating_sum"] += rating * count
+        row["rating_count"] += count
+        if rating in RATING_BUCKETS:
+            row[f"count_{rating}"] += count
+    return list(rows.values())
+
+
+def get_user_rating_stats(user_id):
+    return UserRatingStats.query.filter_by(user_id=user_id).first()
+
+
+def get_user_rating_stats_json(user_id):
+    user_stats = get_user_rating_stats(user_id)
+    if not user_stats:
+        # computed on the fly, without storing it, until the user's next rating
+        user_stats = UserRatingStats(user_id)
+        for key, value in build_rating_stats([user_id])[0].items():
+            setattr(user_stats, key, value)
+    return user_stats.to_json()
+
+
+def get_average_ratings(user_ids):
+    # rounded averages keyed by user id from the stats rows, falling back to AVG() over
+    # the ratings of users without stats; users without ratings are left out
+    user_ids = set(user_ids)
+    averages = {}
+    rows = db.session.query(
+        UserRatingStats.user_id,
+        UserRatingStats.rating_sum,
+        UserRatingStats.rating_count,
+    ).filter(UserRatingStats.user_id.in_(user_ids))
+    for user_id, rating_sum, rating_count in rows:
+        user_ids.discard(user_id)
+        if rating_count:
+            averages[user_id] = round(rating_sum / rating_count)
+    if user_ids:
+        rows = (
+            db.session.query(Rating.rated_id, func.avg(Rating.rating))
+            .filter(Rating.rated_id.in_(user_ids))
+            .group_by(Rating.rated_id)
+        )
+        for user_id, average in rows:
+            averages[user_id] = round(average)
+    return averages
+
+
+def adjust_user_rating_stats(user_id, removed=None, added=None):
+    # moves the user's stats by a removed and/or an added rating in SQL, in the caller's
+    # transaction; users without stats get them built from their ratings instead, which
+    # already include this write
+    values = {
+        "rating_sum": stats.c.rating_sum + (added or 0) - (removed or 0),
+        "rating_count": stats.c.rating_count
+        + (added is not None)
+        - (removed is not None),
+    }
+    for rating, delta in ((removed, -1), (added, 1)):
+        if rating in RATING_BUCKETS:
+            column = f"count_{rating}"
+            values[column] = values.get(column, stats.c[column]) + delta
+    result = db.session.execute(
+        stats.update().where(stats.c.user_id == user_id).values(values)
+    )
+    if not result.rowcount:
+        db.session.flush()
+        db.session.execute(stats.insert(), build_rating_stats([user_id]))
+
+
+def rebuild_user_rating_stats():
+    # back-fills the stats of every rated user from the existing ratings
+    rows = build_rating_stats()
+    UserRatingStats.query.delete()
+    if rows:
+        db.session.execute(stats.insert(), rows)
+    db.session.commit()
+    return len(rows)
@@ -0,0 +1,60 @@
+from datetime import datetime
+from App.models import ResourceRevision
+from App.database import db, upsert
+
+USERS_RESOURCE = "users"
+
+# increments in SQL so concurrent writers don't overwrite each other
+revisions = ResourceRevision.__table__
+
+
+def images_resource(user_id):
+    return f"images:user:{user_id}"
+
+
+def feeds_resource(receiver_id):
+    return f"feeds:receiver:{receiver_id}"
+
+
+def ratings_resource(rated_id):
+    return f"ratings:rated:{rated_id}"
+
+
+def get_resource_revision(resource):
+    return ResourceRevision.query.filter_by(resource=resource).first()
+
+
+def get_revision_stamp(resource):
+    # (revision, updated_at) of a resource, (0, None) until its first write
+    row = (
+        db.session.query(ResourceRevision.revision, ResourceRevision.updated_at)
+        .filter(ResourceRevision.resource == resource)
+        .first()
+    )
+    if row:
+        return tuple(row)
+    return 0, None
+
+
+def bump_revisions(resources, batch_size=500):
+    # bumps the resources' revisions in the caller's transaction, so the new stamp
+    # becomes visible together with the write it describes; upserted so two writes
+    # bumping a resource for the first time can't both insert it
+    resources = sorted(set(resources))
+    updated_at = datetime.utcnow()
+    statement = upsert(revisions)
+    upsert_revision = statement.on_conflict_do_update(
+        index_elements=["resource"],
+        set_={
+            "revision": revisions.c.revision + 1,
+            "updated_at": statement.excluded.updated_at,
+        },
+    )
+    for i in range(0, len(resources), batch_size):
+        db.session.execute(
+            upsert_revision,
+            [
+                {"resource": resource, "revision": 1, "updated_at": updated_at}
+                for resource in resources[i : i + batch_size]
+            ],
+        )
@@ -1,5 +1,10 @@
-from App.models import User
+from App.models import User, Image, Ranking
 from App.database import db
+from App.controllers.revision import bump_revisions, images_resource, USERS_RESOURCE
+from App.controllers.image_rank import recompute_image_ranks
+from App.controllers.rating_stats import get_average_ratings
+
+PROFILE_TOP_IMAGES = 3
 
 
 def create_user(username, password):
@@ -7,6 +12,7 @@ def create_user(username, password):
     if not user:
         new_user = User(username=username, password=password)
         db.session.add(new_user)
+        bump_revisions([USERS_RESOURCE])
         db.session.commit()
         return new_user
     return None
@@ -24,6 +30,7 @@ def set_user_avatar(id, avatar):
     if user:
         user.set_avatar(avatar)
         db.session.add(user)
+        bump_revisions([USERS_RESOURCE])
         db.session.commit()
         return user
     return None
@@ -38,6 +45,59 @@ def get_user(id):
     return User.query.get(id)
 
 
+def get_user_for_update(id):
+    # locks the user row until the commit, so concurrent ratings of the user take turns
+    # and each sees the ratings committed before it
+    return User.query.with_for_update().get(id)
+
+
+def get_existing_user_ids(ids, batch_size=500):
+    # checks the ids in batches to stay under the database's bound parameter limit
+    ids = list(set(ids))
+    existing = set()
+    for i in range(0, len(ids), batch_size):
+        existing.update(
+            user_id
+            for (user_id,) in db.session.query(User.id).filter(
+                User.id.in_(ids[i : i + batch_size])
+            )
+        )
+    return existing
+
+
+def get_user_profiles(ids, top_images=PROFILE_TOP_IMAGES):
+    # profiles keyed by user id, loaded with at most four queries however many users are asked for
+    ids = list(set(ids))
+    if not ids:
+        return {}
+    profiles = {
+        id: {
+            "id": id,
+            "username": username,
+            "avatar": avatar,
+            "images": [],
+            "average_rating": None,
+        }
+        for id, username, avatar in db.session.query(
+            User.id, User.username, User.avatar
+        ).filter(User.id.in_(ids))
+    }
+    images = Image.query.filter(Image.user_id.in_(ids)).all()
+    # highest average rank first
+    for image in sorted(
+        images,
+        key=lambda image: (-image.rank_sum / (image.rank_count or 1), image.id),
+    ):
+        user_images = profiles[image.user_id]["images"]
+        if len(user_images) < top_images:
+            user_images.append(image.to_json())
+    for rated_id, average_rating in get_average_ratings(ids).items():
+        # ratings outlive deleted users
+        if rated_id in profiles:
+            profiles[rated_id]["average_rating"] = average_rating
+    return profiles
+
+
 def get_user_json(id):
     user = get_user(id)
     if user:
@@ -62,6 +122,7 @@ def update_user(id, username):
     if user:
         user.username = username
         db.session.add(user)
+        bump_revisions([USERS_RESOURCE])
         db.session.commit()
         return user
     return None
@@ -70,7 +131,21 @@ def update_user(id, username):
 def delete_user(id):
     user = get_user(id)
     if user:
+        # the user's rankings go with them, so the images they ranked are recomputed
+        ranked = (
+            db.session.query(Image.id, Image.user_id)
+            .join(Ranking, Ranking.image_id == Image.id)
+            .filter(Ranking.ranker_id == id)
+            .distinct()
+            .all()
+        )
         db.session.delete(user)
+        db.session.flush()
+        recompute_image_ranks(image_id for image_id, _ in ranked)
+        bump_revisions(
+            [USERS_RESOURCE, images_resource(id)]
+            + [images_resource(user_id) for _, user_id in ranked]
+        )
         db.session.commit()
         return True
     return False
@@ -1,11 +1,14 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy import and_, bindparam, func, select
+from sqlalchemy.dialects import postgresql, sqlite
 
 db = SQLAlchemy()
 
 
 def get_migrate(app):
-    return Migrate(app, db)
+    # sqlite can't alter most columns in place, so migrations copy the table instead
+    return Migrate(app, db, render_as_batch=True)
 
 
 def create_db(app):
@@ -13,5 +16,61 @@ def create_db(app):
     db.create_all(app=app)
 
 
+def create_indexes(app):
+    # create_all only creates missing tables, so existing databases get new indexes here
+    created = []
+    engine = db.get_engine(app)
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+            created.append(index.name)
+    return created
+
+
+def rebuild_index(app, index):
+    # replaces an index whose definition changed, e.g. one that became unique
+    engine = db.get_engine(app)
+    index.drop(bind=engine, checkfirst=True)
+    index.create(bind=engine)
+    return index.name
+
+
+def upsert(table):
+    # an INSERT that can take ON CONFLICT DO UPDATE, which sqlite and postgres share
+    if db.engine.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+def delete_duplicates(table, columns, batch_size=500):
+    # keeps the newest row of every group sharing the columns and deletes the rest,
+    # one batch of groups per transaction; returns how many rows were deleted
+    keys = [table.c[column] for column in columns]
+    delete_older = table.delete().where(
+        and_(*(key == bindparam(f"b_{key.name}") for key in keys)),
+        table.c.id < bindparam("b_id"),
+    )
+    deleted = 0
+    while True:
+        groups = db.session.execute(
+            select(*keys, func.max(table.c.id))
+            .group_by(*keys)
+            .having(func.count() > 1)
+            .limit(batch_size)
+        ).fetchall()
+        if not groups:
+            break
+        result = db.session.execute(
+            delete_older,
+            [
+                dict(zip([f"b_{key.name}" for key in keys] + ["b_id"], group))
+                for group in groups
+            ],
+        )
+        deleted += result.rowcount
+        db.session.commit()
+    return deleted
+
+
 def init_db(app):
     db.init_app(app)
@@ -0,0 +1,261 @@
+import csv, json, time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from werkzeug.security import generate_password_hash
+
+from App.database import db, upsert
+from App.models import User, Image, Ranking, Rating, DEFAULT_AVATAR
+from App.controllers import (
+    bump_revisions,
+    images_resource,
+    ratings_resource,
+    USERS_RESOURCE,
+    recompute_image_aggregates,
+    rebuild_user_rating_stats,
+)
+
+IMPORT_KINDS = ("users", "images", "rankings", "ratings")
+
+
+def read_records(path, format=None):
+    # streams dicts from a csv file with a header row or a jsonl file, by extension by default
+    if format is None:
+        format = "jsonl" if path.endswith((".jsonl", ".json")) else "csv"
+    with open(path, newline="") as file:
+        if format == "csv":
+            yield from csv.DictReader(file)
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def hash_password(password):
+    return generate_password_hash(password, method="sha256")
+
+
+def get_int(record, key, ids=None):
+    # csv values arrive as strings, jsonl values may already be numbers
+    try:
+        value = int(record[key])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"{key} must be an integer")
+    if ids is not None and value not in ids:
+        raise ValueError(f"{key} does not exist")
+    return value
+
+
+def get_text(record, key):
+    value = record.get(key)
+    if not isinstance(value, str) or not value:
+        raise ValueError(f"{key} is required")
+    return value
+
+
+def get_optional_id(record, ids):
+    # rows may carry their own ids so that later files can refer to them
+    if record.get("id") in (None, ""):
+        return None
+    id = get_int(record, "id")
+    if id in ids:
+        raise ValueError("id already exists")
+    ids.add(id)
+    return id
+
+
+def load_import_state():
+    # the id sets every foreign key is checked against, loaded once per import
+    return {
+        "user_ids": {id for (id,) in db.session.query(User.id)},
+        "usernames": {username for (username,) in db.session.query(User.username)},
+        "image_ids": {id for (id,) in db.session.query(Image.id)},
+    }
+
+
+def prepare_user(record, state):
+    username = get_text(record, "username")
+    if username in state["usernames"]:
+        raise ValueError("username already exists")
+    password = get_text(record, "password")
+    id = get_optional_id(record, state["user_ids"])
+    state["usernames"].add(username)
+    return {
+        "id": id,
+        "username": username,
+        "password": password,
+        "avatar": record.get("avatar") or DEFAULT_AVATAR,
+    }
+
+
+def prepare_image(record, state):
+    user_id = get_int(record, "user_id", state["user_ids"])
+    url = get_text(record, "url")
+    return {
+        "id": get_optional_id(record, state["image_ids"]),
+        "user_id": user_id,
+        "url": url,
+    }
+
+
+def prepare_ranking(record, state):
+    return {
+        "ranker_id": get_int(record, "ranker_id", state["user_ids"]),
+        "image_id": get_int(record, "image_id", state["image_ids"]),
+        "rank": get_int(record, "rank"),
+    }
+
+
+def prepare_rating(record, state):
+    return {
+        "rater_id": get_int(record, "rater_id", state["user_ids"]),
+        "rated_id": get_int(record, "rated_id", state["user_ids"]),
+        "rating": get_int(record, "rating"),
+    }
+
+
+def sync_id_sequence(table):
+    # explicit ids don't advance postgres' serial sequence, so it is moved past them
+    if db.engine.dialect.name == "postgresql":
+        db.session.execute(
+            db.text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                f"(SELECT max(id) FROM {table.name}))"
+            )
+        )
+
+
+def reserve_ids(table, count):
+    # ids for the rows that come without one, drawn from the sequence on postgres so that
+    # concurrent inserts can't take them too
+    if db.engine.dialect.name == "postgresql":
+        return [
+            id
+            for (id,) in db.session.execute(
+                db.text(
+                    f"SELECT nextval(pg_get_serial_sequence('{table.name}', 'id')) "
+                    "FROM generate_series(1, :count)"
+                ),
+                {"count": count},
+            )
+        ]
+    start = (db.session.query(db.func.max(table.c.id)).scalar() or 0) + 1
+    return list(range(start, start + count))
+
+
+def insert_rows(table, rows, ids):
+    # rows with their own id go first, then the rest get ids after them; those are added
+    # to ids so a later record in the file can't claim one of them
+    with_id = [row for row in rows if row["id"] is not None]
+    without_id = [row for row in rows if row["id"] is None]
+    if with_id:
+        db.session.execute(table.insert(), with_id)
+        sync_id_sequence(table)
+    if without_id:
+        for row, id in zip(without_id, reserve_ids(table, len(without_id))):
+            row["id"] = id
+            ids.add(id)
+        db.session.execute(table.insert(), without_id)
+
+
+def upsert_rows(table, rows, keys, updates):
+    # later rows for the same pair replace earlier ones, as create_ranking and create_rating do;
+    # they are collapsed first since one multi-row upsert can't update a row twice
+    rows = list({tuple(row[key] for key in keys): row for row in rows}.values())
+    statement = upsert(table)
+    db.session.execute(
+        statement.on_conflict_do_update(
+            index_elements=keys,
+            set_={column: statement.excluded[column] for column in updates},
+        ),
+        rows,
+    )
+
+
+def write_users(rows, state, pool):
+    passwords = [row["password"] for row in rows]
+    if pool:
+        hashes = pool.map(hash_password, passwords, chunksize=max(len(rows) // 16, 1))
+    else:
+        hashes = map(hash_password, passwords)
+    for row, password in zip(rows, hashes):
+        row["password"] = password
+    insert_rows(User.__table__, rows, state["user_ids"])
+    bump_revisions([USERS_RESOURCE])
+
+
+def write_images(rows, state, pool):
+    insert_rows(Image.__table__, rows, state["image_ids"])
+    bump_revisions([USERS_RESOURCE] + [images_resource(row["user_id"]) for row in rows])
+
+
+def write_rankings(rows, state, pool):
+    upsert_rows(
+        Ranking.__table__, rows, ["ranker_id", "image_id"], ["rank", "ranked_at"]
+    )
+
+
+def write_ratings(rows, state, pool):
+    upsert_rows(Rating.__table__, rows, ["rater_id", "rated_id"], ["rating"])
+    bump_revisions(ratings_resource(row["rated_id"]) for row in rows)
+
+
+IMPORTERS = {
+    "users": (prepare_user, write_users),
+    "images": (prepare_image, write_images),
+    "rankings": (prepare_ranking, write_rankings),
+    "ratings": (prepare_rating, write_ratings),
+}
+
+
+def import_records(kind, records, chunk_size=1000, workers=1, progress=None):
+    # validates the records against in-memory id sets and writes the valid ones in chunks
+    # of one executemany and one commit each; invalid records are counted by reason and skipped
+    prepare, write = IMPORTERS[kind]
+    state = load_import_state()
+    records = iter(records)
+    errors = Counter()
+    read = imported = 0
+    start = time.perf_counter()
+    pool = ProcessPoolExecutor(workers) if kind == "users" and workers > 1 else None
+    try:
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                break
+            read += len(chunk)
+            rows = []
+            for record in chunk:
+                try:
+                    rows.append(prepare(record, state))
+                except ValueError as error:
+                    errors[str(error)] += 1
+            if rows:
+                write(rows, state, pool)
+                db.session.commit()
+                imported += len(rows)
+            if progress:
+                progress(read, imported, time.perf_counter() - start)
+    finally:
+        if pool:
+            pool.shutdown()
+    # the running aggregates are rebuilt once instead of per chunk
+    if kind == "rankings" and imported:
+        recompute_image_aggregates()
+    if kind == "ratings" and imported:
+        rebuild_user_rating_stats()
+    seconds = time.perf_counter() - start
+    return {
+        "kind": kind,
+        "read": read,
+        "imported": imported,
+        "skipped": dict(errors),
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(imported / seconds) if seconds else None,
+    }
+
+
+def import_file(kind, path, format=None, chunk_size=1000, workers=1, progress=None):
+    return import_records(
+        kind, read_records(path, format), chunk_size, workers, progress
+    )
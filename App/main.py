@@ -18,10 +18,19 @@ from App.views import (
     ranking_views,
     image_views,
     feed_views,
+    distributor_views,
 )
 
 # New views must be imported and added to this list
-views = [index_views, user_views, rating_views, ranking_views, image_views, feed_views]
+views = [
+    index_views,
+    user_views,
+    rating_views,
+    ranking_views,
+    image_views,
+    feed_views,
+    distributor_views,
+]
 
 
 def add_views(app, views):
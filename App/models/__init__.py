@@ -4,3 +4,8 @@ from .ranking import *
 from .distributor import *
 from .feed import *
 from .rating import *
+from .distribution_job import *
+from .feed_daily_counter import *
+from .feed_pair import *
+from .resource_revision import *
+from .user_rating_stats import *
@@ -0,0 +1,36 @@
+from App.database import db
+from datetime import datetime
+
+
+class DistributionJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default="pending", index=True)
+    requested_at = db.Column(db.DateTime, default=datetime.now)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    rounds = db.Column(db.Integer)
+    error = db.Column(db.String(255))
+
+    def __init__(self):
+        self.status = "pending"
+
+    # Accessors
+    def get_id(self):
+        return self.id
+
+    def get_status(self):
+        return self.status
+
+    def get_rounds(self):
+        return self.rounds
+
+    def to_json(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "requested_at": self.requested_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "rounds": self.rounds,
+            "error": self.error,
+        }
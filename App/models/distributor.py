@@ -8,7 +8,7 @@ class Distributor(db.Model):
     feed = db.relationship(
         "Feed", backref="distributor", lazy=True, cascade="all, delete-orphan"
     )
-    timestamp = db.Column(db.DateTime, default=datetime.now)
+    timestamp = db.Column(db.DateTime, default=datetime.now, index=True)
 
     def __init__(self, num_profiles):
         self.num_profiles = num_profiles
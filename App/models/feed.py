@@ -2,6 +2,13 @@ from App.database import db
 
 
 class Feed(db.Model):
+    # (receiver_id, seen, id) serves the inbox, unseen counts and bulk views; (sender_id, distributor_id)
+    # serves sender listings and the distribution joins
+    __table_args__ = (
+        db.Index("ix_feed_receiver_seen_id", "receiver_id", "seen", "id"),
+        db.Index("ix_feed_sender_distributor", "sender_id", "distributor_id"),
+        db.Index("ix_feed_distributor_id", "distributor_id"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     receiver_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
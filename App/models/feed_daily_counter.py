@@ -0,0 +1,43 @@
+from App.database import db
+
+
+class FeedDailyCounter(db.Model):
+    # the unique (day, user_id) index serves both the per-user lookup and loading a whole day;
+    # the count indexes give the day's least loaded senders and receivers in order
+    __table_args__ = (
+        db.Index("ix_feed_daily_counter_day_user", "day", "user_id", unique=True),
+        db.Index("ix_feed_daily_counter_day_sent", "day", "sent", "user_id"),
+        db.Index("ix_feed_daily_counter_day_received", "day", "received", "user_id"),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    sent = db.Column(db.Integer, nullable=False, default=0)
+    received = db.Column(db.Integer, nullable=False, default=0)
+
+    def __init__(self, user_id, day, sent=0, received=0):
+        self.user_id = user_id
+        self.day = day
+        self.sent = sent
+        self.received = received
+
+    # Accessors
+    def get_user_id(self):
+        return self.user_id
+
+    def get_day(self):
+        return self.day
+
+    def get_sent(self):
+        return self.sent
+
+    def get_received(self):
+        return self.received
+
+    def to_json(self):
+        return {
+            "user_id": self.user_id,
+            "day": self.day,
+            "sent": self.sent,
+            "received": self.received,
+        }
@@ -0,0 +1,32 @@
+from App.database import db
+
+
+class FeedPair(db.Model):
+    # summary of the (sender, receiver) pairs of archived feeds, so archiving never allows a repeat
+    __table_args__ = (
+        db.Index(
+            "ix_feed_pair_receiver_sender", "receiver_id", "sender_id", unique=True
+        ),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    sender_id = db.Column(
+        db.Integer, db.ForeignKey("user.id"), nullable=False, index=True
+    )
+    receiver_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+
+    def __init__(self, sender_id, receiver_id):
+        self.sender_id = sender_id
+        self.receiver_id = receiver_id
+
+    def get_sender_id(self):
+        return self.sender_id
+
+    def get_receiver_id(self):
+        return self.receiver_id
+
+    def to_json(self):
+        return {
+            "id": self.id,
+            "sender_id": self.sender_id,
+            "receiver_id": self.receiver_id,
+        }
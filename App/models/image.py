@@ -2,14 +2,25 @@ from App.database import db
 
 
 class Image(db.Model):
+    # (avg_rank, id) keeps the leaderboard in order, so a top-k read walks k index entries
+    __table_args__ = (db.Index("ix_image_avg_rank_id", "avg_rank", "id"),)
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("user.id"), nullable=False, index=True
+    )
     url = db.Column(db.String(120), nullable=False)
+    # running totals of the image's rankings, kept by the ranking controllers
+    rank_sum = db.Column(db.Integer, nullable=False, default=0)
+    rank_count = db.Column(db.Integer, nullable=False, default=0)
+    avg_rank = db.Column(db.Float, nullable=False, default=0)
     rankings = db.relationship("Ranking", backref="image", lazy=True)
 
     def __init__(self, user_id, url):
         self.user_id = user_id
         self.url = url
+        self.rank_sum = 0
+        self.rank_count = 0
+        self.avg_rank = 0
 
     # Accessors
     def get_id(self):
@@ -30,20 +41,19 @@ class Image(db.Model):
     def get_all_rankings(self):
         return self.rankings
 
+    def get_rank_count(self):
+        return self.rank_count
+
     def get_average_rank(self):
-        rankings = self.rankings
-        if len(rankings) == 0:
+        if not self.rank_count:
             return 0
-        total = 0
-        for ranking in rankings:
-            total += ranking.rank
-        return round(total / len(rankings))
+        return round(self.rank_sum / self.rank_count)
 
     def to_json(self):
         return {
             "id": self.id,
             "user_id": self.user_id,
             "rank": self.get_average_rank(),
-            "num_rankings": len(self.rankings),
+            "num_rankings": self.rank_count,
             "url": self.url,
         }
@@ -1,11 +1,20 @@
+from datetime import datetime
 from App.database import db
 
 
 class Ranking(db.Model):
+    __table_args__ = (
+        db.Index("ix_ranking_image_id", "image_id"),
+        # one ranking per ranker and image, which create_ranking upserts on
+        db.Index("ix_ranking_ranker_image", "ranker_id", "image_id", unique=True),
+        db.Index("ix_ranking_ranked_at", "ranked_at"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     ranker_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     image_id = db.Column(db.Integer, db.ForeignKey("image.id"), nullable=False)
     rank = db.Column(db.Integer, nullable=False)
+    # when the rank was last given, for the rolling leaderboards
+    ranked_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
 
     def __init__(self, ranker_id, image_id, rank):
         self.ranker_id = ranker_id
@@ -2,6 +2,11 @@ from App.database import db
 
 
 class Rating(db.Model):
+    __table_args__ = (
+        db.Index("ix_rating_rated_id", "rated_id"),
+        # one rating per rater and rated user, which create_rating upserts on
+        db.Index("ix_rating_rater_rated", "rater_id", "rated_id", unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     rater_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     rated_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
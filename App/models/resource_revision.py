@@ -0,0 +1,32 @@
+from datetime import datetime
+from App.database import db
+
+
+class ResourceRevision(db.Model):
+    # a version stamp per cacheable resource, bumped by the controllers that write to it
+    id = db.Column(db.Integer, primary_key=True)
+    resource = db.Column(db.String(64), nullable=False, unique=True)
+    revision = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __init__(self, resource, revision=0):
+        self.resource = resource
+        self.revision = revision
+        self.updated_at = datetime.utcnow()
+
+    # Accessors
+    def get_resource(self):
+        return self.resource
+
+    def get_revision(self):
+        return self.revision
+
+    def get_updated_at(self):
+        return self.updated_at
+
+    def to_json(self):
+        return {
+            "resource": self.resource,
+            "revision": self.revision,
+            "updated_at": self.updated_at,
+        }
@@ -1,6 +1,10 @@
 from werkzeug.security import check_password_hash, generate_password_hash
 from App.database import db
 
+DEFAULT_AVATAR = (
+    "https://gravatar.com/avatar/0020f74200278c9a66fc97e1ffb3e1bf?s=400&d=robohash&r=x"
+)
+
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -17,7 +21,7 @@ class User(db.Model):
     def __init__(self, username, password):
         self.username = username
         self.set_password(password)
-        self.avatar = "https://gravatar.com/avatar/0020f74200278c9a66fc97e1ffb3e1bf?s=400&d=robohash&r=x"
+        self.avatar = DEFAULT_AVATAR
 
     def get_id(self):
         return self.id
@@ -0,0 +1,51 @@
+from App.database import db
+
+RATING_BUCKETS = range(1, 6)
+
+
+class UserRatingStats(db.Model):
+    # running totals of the ratings a user has received, kept by the rating controllers
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("user.id"), nullable=False, unique=True
+    )
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    # how many ratings of 1 to 5 the user received
+    count_1 = db.Column(db.Integer, nullable=False, default=0)
+    count_2 = db.Column(db.Integer, nullable=False, default=0)
+    count_3 = db.Column(db.Integer, nullable=False, default=0)
+    count_4 = db.Column(db.Integer, nullable=False, default=0)
+    count_5 = db.Column(db.Integer, nullable=False, default=0)
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.rating_sum = 0
+        self.rating_count = 0
+        for rating in RATING_BUCKETS:
+            setattr(self, f"count_{rating}", 0)
+
+    # Accessors
+    def get_user_id(self):
+        return self.user_id
+
+    def get_rating_count(self):
+        return self.rating_count
+
+    def get_average(self):
+        if not self.rating_count:
+            return None
+        return round(self.rating_sum / self.rating_count)
+
+    def get_histogram(self):
+        return {
+            str(rating): getattr(self, f"count_{rating}") for rating in RATING_BUCKETS
+        }
+
+    def to_json(self):
+        return {
+            "user_id": self.user_id,
+            "average": self.get_average(),
+            "count": self.rating_count,
+            "histogram": self.get_histogram(),
+        }
@@ -1,7 +1,15 @@
 # import os
+import gzip
+import json
 import logging
+import os
+import tempfile
 import pytest
 import unittest
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from sqlalchemy import event
 from werkzeug.security import generate_password_hash
 
 from App.controllers.auth import authenticate
@@ -9,15 +17,62 @@ from App.controllers.distributor import (
     create_distributor,
     get_distributor,
     get_distributor_json,
+    get_all_distributors,
     delete_distributor,
+    match_feeds,
+    match_feeds_partitioned,
+    distribute,
+    distribute_user,
+    find_distribution_partner,
+    export_distribution,
+    get_distribution_table,
+    DISTRIBUTION_COLUMNS,
+)
+from App.controllers.pair_index import PairIndex, get_pair_index, reset_pair_index
+from App.controllers.archive import archive_feeds, get_all_feed_pairs
+from App.controllers.planner import plan_distribution
+from App.controllers.distribution_job import (
+    request_distribution,
+    run_distribution_job,
+    get_last_distribution_job,
+    get_distribution_job,
+)
+from App.controllers.feed_events import (
+    subscribe_feeds,
+    unsubscribe_feeds,
+    notify_feed_receivers,
+    stream_feeds,
+)
+from App.controllers.revision import (
+    bump_revisions,
+    get_revision_stamp,
+    feeds_resource,
+    images_resource,
+    ratings_resource,
+)
+from App.controllers.rating_stats import (
+    get_user_rating_stats,
+    get_user_rating_stats_json,
+    rebuild_user_rating_stats,
+)
+from App.controllers.feed_counter import (
+    get_daily_sent_count,
+    get_daily_received_count,
+    rebuild_daily_feed_counters,
 )
 from App.controllers.feed import (
     create_feed,
+    create_feeds,
     get_feed,
+    get_all_feeds,
+    get_feeds_by_receiver_page_json,
     get_feeds_by_receiver,
     get_feeds_by_sender,
     get_feed_json,
     view_feed,
+    view_feeds,
+    get_unseen_feed_count,
+    expand_feed_senders,
     delete_feed,
 )
 from App.controllers.image import (
@@ -27,13 +82,19 @@ from App.controllers.image import (
     get_image_json,
     get_average_image_rank,
     get_image_rankings,
+    get_images_page_json,
+    get_top_images_json,
+    recompute_image_aggregates,
     delete_image,
 )
 from App.controllers.ranking import (
     create_ranking,
+    create_rankings,
+    dedupe_rankings,
     get_ranking,
     get_ranking_json,
     get_rankings_by_ranker,
+    is_ranking_item,
     get_rankings_by_image,
     update_ranking,
     delete_ranking,
@@ -45,22 +106,65 @@ from App.controllers.rating import (
     get_ratings_by_rater,
     get_ratings_by_rated,
     get_average_rating_by_rated,
+    dedupe_ratings,
     update_rating,
     delete_rating,
 )
 from App.controllers.user import (
     create_user,
     get_user,
+    get_user_by_username,
     get_all_users,
+    get_user_profiles,
     update_user,
     delete_user,
 )
-from App.database import create_db
-from App.models import User, Image, Rating, Ranking, Feed, Distributor
+from App.database import db, create_db, rebuild_index
+from App.models import (
+    User,
+    Image,
+    Rating,
+    Ranking,
+    Feed,
+    Distributor,
+    DistributionJob,
+    FeedDailyCounter,
+    FeedPair,
+    UserRatingStats,
+)
+from App.importer import import_file, import_records
+from App.views.conditional import conditional_response
+from App.views.feed import get_view_feeds_args
+from App.views.image import get_window_arg
 from wsgi import app
 
 LOGGER = logging.getLogger(__name__)
 
+
+def explain(query):
+    # returns the steps of sqlite's query plan for an orm query
+    statement = query.statement.compile(
+        db.engine, compile_kwargs={"literal_binds": True}
+    )
+    plan = db.session.execute(db.text(f"EXPLAIN QUERY PLAN {statement}")).fetchall()
+    return [row[-1] for row in plan]
+
+
+@contextmanager
+def count_statements():
+    # collects the sql statements sent to the database inside the block
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", count_statement)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count_statement)
+
+
 """
    Unit Tests
 """
@@ -197,6 +301,87 @@ class DistributorUnitTests(unittest.TestCase):
             },
         )
 
+    def test_match_feeds(self):
+        assignments = match_feeds([1, 2, 3], 3, Counter(), Counter(), {(2, 1)})
+        self.assertListEqual(assignments, [(3, 1), (1, 2), (2, 3)])
+
+    def test_match_feeds_at_limit(self):
+        assignments = match_feeds([1, 2, 3], 3, Counter({1: 3}), Counter({2: 3}), set())
+        self.assertListEqual(assignments, [(2, 1)])
+
+    def test_match_feeds_partitioned(self):
+        profile_ids = list(range(1, 21))
+        assignments = match_feeds_partitioned(
+            profile_ids, 20, Counter(), Counter(), PairIndex([(2, 1)]), 2
+        )
+        senders = [sender_id for sender_id, receiver_id in assignments]
+        receivers = [receiver_id for sender_id, receiver_id in assignments]
+        assert sorted(receivers) == profile_ids
+        assert len(set(senders)) == len(senders)
+        assert (2, 1) not in assignments
+        assert all(sender_id != receiver_id for sender_id, receiver_id in assignments)
+
+
+class PairIndexUnitTests(unittest.TestCase):
+    def test_contains(self):
+        index = PairIndex([(3, 1), (2, 1), (3, 2)])
+        assert (2, 1) in index
+        assert (1, 2) not in index
+        assert (4, 1) not in index
+
+    def test_add_is_idempotent(self):
+        index = PairIndex([(3, 1), (2, 1)])
+        index.add(2, 1)
+        assert len(index) == 2
+        assert list(index.senders[1]) == [2, 3]
+
+    def test_subset(self):
+        index = PairIndex([(3, 1), (2, 1), (3, 2)])
+        assert sorted(index.subset([2])) == [(3, 2)]
+
+    def test_with_pairs_leaves_index_unchanged(self):
+        index = PairIndex([(3, 1), (3, 2)])
+        index2 = index.with_pairs([(2, 1), (3, 2)])
+        assert sorted(index) == [(3, 1), (3, 2)]
+        assert sorted(index2) == [(2, 1), (3, 1), (3, 2)]
+        assert index2.senders[2] is index.senders[2]
+
+
+class FeedPairUnitTests(unittest.TestCase):
+    def test_new_feed_pair(self):
+        pair = FeedPair(1, 2)
+        assert pair.sender_id == 1 and pair.receiver_id == 2
+
+
+class DistributionJobUnitTests(unittest.TestCase):
+    def test_new_distribution_job(self):
+        job = DistributionJob()
+        assert job.status == "pending"
+
+
+class FeedEventsUnitTests(unittest.TestCase):
+    def test_notify_feed_receivers(self):
+        subscription = subscribe_feeds(9001)
+        notify_feed_receivers([9001, 9001, 9002])
+        assert subscription.get_nowait() is True
+        assert subscription.empty()
+        unsubscribe_feeds(9001, subscription)
+        notify_feed_receivers([9001])
+        assert subscription.empty()
+
+
+class UserRatingStatsUnitTests(unittest.TestCase):
+    def test_new_user_rating_stats(self):
+        user_stats = UserRatingStats(1)
+        assert user_stats.get_average() is None
+        assert user_stats.get_histogram() == {"1": 0, "2": 0, "3": 0, "4": 0, "5": 0}
+
+
+class FeedDailyCounterUnitTests(unittest.TestCase):
+    def test_new_feed_daily_counter(self):
+        counter = FeedDailyCounter(1, date(2022, 11, 1))
+        assert counter.sent == 0 and counter.received == 0
+
 
 """
     Integration Tests
@@ -238,6 +423,29 @@ class UsersIntegrationTests(unittest.TestCase):
         user = get_user(9080)
         assert user is None
 
+    def test_get_user_profiles(self):
+        user = create_user("rob5", "robpass")
+        rater = create_user("rob6", "robpass")
+        images = [
+            create_image(user.get_id(), f"https://example.com/{i}.png")
+            for i in range(4)
+        ]
+        create_ranking(rater.get_id(), images[2].get_id(), 5)
+        create_ranking(rater.get_id(), images[1].get_id(), 3)
+        create_rating(rater.get_id(), user.get_id(), 4)
+        profiles = get_user_profiles([user.get_id(), rater.get_id(), 9080])
+        profile = profiles[user.get_id()]
+        assert profile["username"] == "rob5"
+        assert [image["id"] for image in profile["images"]] == [
+            images[2].get_id(),
+            images[1].get_id(),
+            images[0].get_id(),
+        ]
+        assert profile["images"][0]["rank"] == 5
+        assert profile["average_rating"] == 4
+        assert profiles[rater.get_id()]["average_rating"] is None
+        assert 9080 not in profiles
+
     def test_update_user(self):
         user = create_user("rob2", "robpass")
         user = update_user(user.get_id(), "rob3")
@@ -252,6 +460,18 @@ class UsersIntegrationTests(unittest.TestCase):
         status = delete_user(user.get_id())
         assert status is True
 
+    def test_delete_user_removes_their_ranks(self):
+        owner = create_user("rob7", "robpass")
+        ranker = create_user("rob8", "robpass")
+        image = create_image(owner.get_id(), "https://example.com/rob.png")
+        create_ranking(1, image.get_id(), 2)
+        create_ranking(ranker.get_id(), image.get_id(), 4)
+        images = get_revision_stamp(images_resource(owner.get_id()))[0]
+        assert delete_user(ranker.get_id()) is True
+        image = get_image(image.get_id())
+        assert (image.rank_sum, image.rank_count, image.avg_rank) == (2, 1, 2)
+        assert get_revision_stamp(images_resource(owner.get_id()))[0] == images + 1
+
 
 # test imported methods from App.controllers.image
 class ImagesIntegrationTests(unittest.TestCase):
@@ -303,11 +523,106 @@ class ImagesIntegrationTests(unittest.TestCase):
         user = create_user("tom5", "tompass")
         user2 = create_user("tom6", "tompass")
         image = create_image(user.get_id(), "https://www.picsum.com/200/300")
-        create_ranking(user2.get_id(), image.get_id(), 1)
+        create_ranking(user.get_id(), image.get_id(), 1)
         create_ranking(user2.get_id(), image.get_id(), 3)
         average_rank = get_average_image_rank(image.get_id())
         assert average_rank == 2
 
+    def test_ranking_updates_image_aggregates(self):
+        user = create_user("tom10", "tompass")
+        user2 = create_user("tom11", "tompass")
+        image = create_image(user.get_id(), "https://www.picsum.com/200/300")
+        ranking = create_ranking(user2.get_id(), image.get_id(), 2)
+        create_ranking(user.get_id(), image.get_id(), 4)
+        update_ranking(ranking.get_id(), 5)
+        image = get_image(image.get_id())
+        assert (image.rank_sum, image.rank_count) == (9, 2)
+        delete_ranking(ranking.get_id())
+        image = get_image(image.get_id())
+        assert (image.rank_sum, image.rank_count) == (4, 1)
+        assert image.to_json()["num_rankings"] == 1
+
+    def test_recompute_image_aggregates(self):
+        user = create_user("tom12", "tompass")
+        image = create_image(user.get_id(), "https://www.picsum.com/200/300")
+        create_ranking(user.get_id(), image.get_id(), 3)
+        image.rank_sum = 0
+        image.rank_count = 5
+        db.session.commit()
+        assert recompute_image_aggregates() == 1
+        image = get_image(image.get_id())
+        assert (image.rank_sum, image.rank_count) == (3, 1)
+        assert recompute_image_aggregates() == 0
+
+    def test_get_images_page(self):
+        user = create_user("tom13", "tompass")
+        images = [
+            create_image(user.get_id(), f"https://www.picsum.com/{i}") for i in range(3)
+        ]
+        create_ranking(user.get_id(), images[0].get_id(), 5)
+        create_ranking(user.get_id(), images[1].get_id(), 2)
+        user_id = user.get_id()
+        with count_statements() as statements:
+            page = get_images_page_json(user_id, limit=2)
+        assert len(statements) == 1
+        assert [image["id"] for image in page["images"]] == [
+            images[2].get_id(),
+            images[1].get_id(),
+        ]
+        assert page["next_page"] == 2
+        page = get_images_page_json(user.get_id(), limit=2, page=2)
+        assert [image["id"] for image in page["images"]] == [images[0].get_id()]
+        assert page["next_page"] is None
+
+    def test_get_images_page_by_rank(self):
+        user = create_user("tom14", "tompass")
+        images = [
+            create_image(user.get_id(), f"https://www.picsum.com/{i}") for i in range(3)
+        ]
+        create_ranking(user.get_id(), images[0].get_id(), 5)
+        create_ranking(user.get_id(), images[1].get_id(), 2)
+        page = get_images_page_json(user.get_id(), sort="rank")
+        assert [image["id"] for image in page["images"]] == [
+            images[0].get_id(),
+            images[1].get_id(),
+            images[2].get_id(),
+        ]
+        assert page["images"][0] == get_image_json(images[0].get_id())
+
+    def test_get_top_images(self):
+        user = create_user("tom15", "tompass")
+        image = create_image(user.get_id(), "https://www.picsum.com/top")
+        create_ranking(user.get_id(), image.get_id(), 100)
+        create_image(user.get_id(), "https://www.picsum.com/unranked")
+        top = get_top_images_json(limit=1)
+        assert [entry["id"] for entry in top] == [image.get_id()]
+        assert top[0]["average_rank"] == 100
+        assert (
+            len(get_top_images_json(limit=1000))
+            == Image.query.filter(Image.rank_count > 0).count()
+        )
+
+    def test_get_window_arg(self):
+        for window, expected in (("all", None), ("24h", timedelta(hours=24))):
+            with app.test_request_context(f"/?window={window}"):
+                assert get_window_arg() == expected
+        for window in ("0h", "366d", "99999999999d", "7w", "d"):
+            with app.test_request_context(f"/?window={window}"):
+                self.assertRaises(ValueError, get_window_arg)
+
+    def test_get_top_images_in_window(self):
+        user = create_user("tom16", "tompass")
+        image = create_image(user.get_id(), "https://www.picsum.com/old")
+        ranking = create_ranking(user.get_id(), image.get_id(), 200)
+        ranking.ranked_at = datetime.now() - timedelta(days=30)
+        db.session.commit()
+        recent = create_image(user.get_id(), "https://www.picsum.com/recent")
+        create_ranking(user.get_id(), recent.get_id(), 150)
+        assert get_top_images_json(limit=1)[0]["id"] == image.get_id()
+        top = get_top_images_json(limit=1, window=timedelta(days=7))
+        assert top[0]["id"] == recent.get_id()
+        assert top[0]["window_rankings"] == 1
+
     def test_get_average_image_rank_with_invalid_image_id(self):
         average_rank = get_average_image_rank(9080)
         assert average_rank == 0
@@ -316,7 +631,7 @@ class ImagesIntegrationTests(unittest.TestCase):
         user = create_user("tom7", "tompass")
         user2 = create_user("tom8", "tompass")
         image = create_image(user.get_id(), "https://www.picsum.com/200/300")
-        create_ranking(user2.get_id(), image.get_id(), 1)
+        create_ranking(user.get_id(), image.get_id(), 1)
         create_ranking(user2.get_id(), image.get_id(), 3)
         rankings = get_image_rankings(image.get_id())
         assert len(rankings) == 2
@@ -342,6 +657,42 @@ class FeedIntegrationTests(unittest.TestCase):
             feed = create_feed(1, 9080, 1)
             assert feed is None
 
+    def test_create_feeds(self):
+        user = create_user("jane6", "janepass")
+        count = create_feeds(
+            [(1, user.get_id()), (2, user.get_id()), (9080, user.get_id())], 1
+        )
+        assert count == 2
+        assert len(get_feeds_by_receiver(user.get_id())) == 2
+
+    def test_create_feeds_in_chunks(self):
+        user = create_user("jane7", "janepass")
+        count = create_feeds(
+            [(1, user.get_id()), (2, user.get_id()), (3, user.get_id())],
+            1,
+            chunk_size=2,
+        )
+        assert count == 3
+        assert len(get_feeds_by_receiver(user.get_id())) == 3
+
+    def test_create_feeds_updates_daily_counters(self):
+        sender = create_user("jane8", "janepass")
+        receiver = create_user("jane9", "janepass")
+        create_feeds([(sender.get_id(), receiver.get_id())], 1)
+        assert get_daily_sent_count(sender.get_id()) == 1
+        assert get_daily_received_count(receiver.get_id()) == 1
+        assert get_daily_received_count(sender.get_id()) == 0
+        create_feeds([(sender.get_id(), 1), (receiver.get_id(), sender.get_id())], 1)
+        assert get_daily_sent_count(sender.get_id()) == 2
+        assert get_daily_received_count(sender.get_id()) == 1
+
+    def test_delete_feed_updates_daily_counters(self):
+        distributor = create_distributor()
+        sender = create_user("jane10", "janepass")
+        feed = create_feed(sender.get_id(), 2, distributor.get_id())
+        delete_feed(feed.get_id())
+        assert get_daily_sent_count(sender.get_id()) == 0
+
     def test_get_feed(self):
         feed = create_feed(1, 2, 1)
         feed2 = get_feed(feed.get_id())
@@ -378,11 +729,90 @@ class FeedIntegrationTests(unittest.TestCase):
         feeds = get_feeds_by_receiver(user.get_id())
         assert len(feeds) == 2
 
+    def test_get_feeds_by_receiver_page(self):
+        user = create_user("jane11", "janepass")
+        feeds = [create_feed(sender_id, user.get_id(), 1) for sender_id in (1, 2, 3)]
+        page = get_feeds_by_receiver_page_json(user.get_id(), limit=2)
+        assert [feed["id"] for feed in page["feeds"]] == [
+            feeds[2].get_id(),
+            feeds[1].get_id(),
+        ]
+        assert page["next_cursor"] == feeds[1].get_id()
+        page = get_feeds_by_receiver_page_json(
+            user.get_id(), limit=2, after=page["next_cursor"]
+        )
+        assert [feed["id"] for feed in page["feeds"]] == [feeds[0].get_id()]
+        assert page["next_cursor"] is None
+
+    def test_get_feeds_by_receiver_page_unseen(self):
+        user = create_user("jane12", "janepass")
+        feed = create_feed(1, user.get_id(), 1)
+        create_feed(2, user.get_id(), 1)
+        view_feed(feed.get_id())
+        page = get_feeds_by_receiver_page_json(user.get_id(), seen=False)
+        assert [feed["sender_id"] for feed in page["feeds"]] == [2]
+
     def test_view_feed(self):
         feed = create_feed(1, 2, 1)
         feed = view_feed(feed.get_id())
         assert feed.is_seen() is True
 
+    def test_view_feeds(self):
+        feeds = [create_feed(1, 2, 1), create_feed(3, 2, 1)]
+        count = view_feeds([feed.get_id() for feed in feeds])
+        assert count == 2
+        assert all(get_feed(feed.get_id()).is_seen() for feed in feeds)
+
+    def test_view_feeds_by_receiver_up_to(self):
+        user = create_user("jane13", "janepass")
+        feeds = [create_feed(sender_id, user.get_id(), 1) for sender_id in (1, 2, 3)]
+        count = view_feeds(receiver_id=user.get_id(), up_to=feeds[1].get_id())
+        assert count == 2
+        assert get_feed(feeds[1].get_id()).is_seen() is True
+        assert get_feed(feeds[2].get_id()).is_seen() is False
+
+    def test_get_view_feeds_args(self):
+        for body, expected in (
+            ({"ids": [1, 2]}, ([1, 2], None, None)),
+            ({"receiver_id": 2, "up_to": 9}, (None, 2, 9)),
+        ):
+            with app.test_request_context("/", method="POST", json=body):
+                assert get_view_feeds_args() == expected
+        for body in (
+            {},
+            {"ids": [1, "2"]},
+            {"ids": [True]},
+            {"ids": list(range(101))},
+            {"receiver_id": "2"},
+            {"receiver_id": 2.5},
+            {"receiver_id": 2, "up_to": "9"},
+        ):
+            with app.test_request_context("/", method="POST", json=body):
+                self.assertRaises(ValueError, get_view_feeds_args)
+
+    def test_get_unseen_feed_count(self):
+        user = create_user("jane14", "janepass")
+        feed = create_feed(1, user.get_id(), 1)
+        create_feed(2, user.get_id(), 1)
+        assert get_unseen_feed_count(user.get_id()) == 2
+        view_feed(feed.get_id())
+        assert get_unseen_feed_count(user.get_id()) == 1
+
+    def test_expand_feed_senders(self):
+        receiver = create_user("jane15", "janepass")
+        senders = [create_user(f"exp{i}", "exppass") for i in range(4)]
+        for sender in senders:
+            create_feed(sender.get_id(), receiver.get_id(), 1)
+            create_image(sender.get_id(), "https://example.com/exp.png")
+        feeds = get_feeds_by_receiver_page_json(receiver.get_id())["feeds"]
+        with count_statements() as statements:
+            expand_feed_senders(feeds[:1])
+        with count_statements() as more_statements:
+            expand_feed_senders(feeds)
+        assert len(statements) == len(more_statements) == 4
+        assert feeds[0]["sender"]["username"] == "exp3"
+        assert feeds[0]["sender"]["images"][0]["num_rankings"] == 0
+
     def test_view_feed_with_invalid_id(self):
         feed = view_feed(9080)
         assert feed is None
@@ -411,6 +841,66 @@ class RatingsIntegrationTests(unittest.TestCase):
             rating = create_rating(1, 9080, 5)
             assert rating is None
 
+    def test_create_rating_again_replaces_rating(self):
+        user = create_user("jane20", "janepass")
+        rating = create_rating(user.get_id(), 2, 5)
+        rating2 = create_rating(user.get_id(), 2, 3)
+        assert rating2.get_id() == rating.get_id()
+        assert rating2.get_rating() == 3
+        assert len(get_ratings_by_rater(user.get_id())) == 1
+
+    def test_dedupe_ratings(self):
+        user = create_user("jane21", "janepass")
+        index = next(i for i in Rating.__table__.indexes if i.unique)
+        index.drop(bind=db.engine)
+        db.session.execute(
+            Rating.__table__.insert(),
+            [
+                {"rater_id": user.get_id(), "rated_id": 2, "rating": rating}
+                for rating in (1, 4)
+            ],
+        )
+        db.session.commit()
+        assert dedupe_ratings() == 1
+        rebuild_index(app, index)
+        assert [r.get_rating() for r in get_ratings_by_rater(user.get_id())] == [4]
+
+    def test_rating_writes_update_stats(self):
+        user = create_user("jane22", "janepass")
+        rating = create_rating(1, user.get_id(), 5)
+        create_rating(2, user.get_id(), 2)
+        create_rating(2, user.get_id(), 3)
+        update_rating(rating.get_id(), 4)
+        stats = get_user_rating_stats_json(user.get_id())
+        assert stats["count"] == 2 and stats["average"] == 4
+        assert stats["histogram"] == {"1": 0, "2": 0, "3": 1, "4": 1, "5": 0}
+        delete_rating(rating.get_id())
+        assert get_user_rating_stats(user.get_id()).rating_sum == 3
+        assert get_average_rating_by_rated(user.get_id()) == 3
+
+    def test_rating_stats_fall_back_and_rebuild(self):
+        user = create_user("jane23", "janepass")
+        create_rating(1, user.get_id(), 2)
+        create_rating(2, user.get_id(), 5)
+        UserRatingStats.query.filter_by(user_id=user.get_id()).delete()
+        db.session.commit()
+        assert get_average_rating_by_rated(user.get_id()) == 4
+        assert get_user_rating_stats_json(user.get_id())["count"] == 2
+        create_rating(3, user.get_id(), 5)
+        assert get_user_rating_stats(user.get_id()).rating_count == 3
+        assert rebuild_user_rating_stats() > 0
+        assert get_user_rating_stats(user.get_id()).rating_sum == 12
+
+    def test_update_rating_without_stats(self):
+        user = create_user("jane24", "janepass")
+        rating = create_rating(1, user.get_id(), 2)
+        UserRatingStats.query.filter_by(user_id=user.get_id()).delete()
+        db.session.commit()
+        update_rating(rating.get_id(), 5)
+        stats = get_user_rating_stats(user.get_id())
+        assert stats.rating_sum == 5 and stats.count_2 == 0 and stats.count_5 == 1
+        assert get_user_rating_stats_json(user.get_id())["average"] == 5
+
     def test_get_rating(self):
         rating = create_rating(1, 2, 5)
         rating2 = get_rating(rating.get_id())
@@ -482,6 +972,77 @@ class RankingsIntegrationTests(unittest.TestCase):
             ranking = create_ranking(9080, 1, 5)
             assert ranking is None
 
+    def test_create_rankings(self):
+        user = create_user("jane16", "janepass")
+        images = [create_image(1, "https://www.picsum.com/batch") for i in range(2)]
+        items = [
+            {"ranker_id": user.get_id(), "image_id": images[0].get_id(), "rank": 4},
+            {"ranker_id": 1, "image_id": images[0].get_id(), "rank": 2},
+            {"ranker_id": user.get_id(), "image_id": images[1].get_id(), "rank": 5},
+            {"ranker_id": 9080, "image_id": images[1].get_id(), "rank": 5},
+            {"ranker_id": user.get_id(), "image_id": 9080, "rank": 5},
+            {"ranker_id": user.get_id(), "image_id": images[1].get_id()},
+        ]
+        results = create_rankings(items)
+        assert [result["ranking"]["rank"] for result in results[:3]] == [4, 2, 5]
+        assert [result["error"] for result in results[3:5]] == [
+            "Ranker does not exist",
+            "Image does not exist",
+        ]
+        assert "error" in results[5]
+        image = get_image(images[0].get_id())
+        assert (image.rank_sum, image.rank_count, image.avg_rank) == (6, 2, 3)
+        assert get_ranking(results[2]["ranking"]["id"]).get_rank() == 5
+
+    def test_is_ranking_item(self):
+        item = {"ranker_id": 1, "image_id": 2, "rank": 3}
+        assert is_ranking_item(item)
+        assert not is_ranking_item(dict(item, rank=True))
+        assert not is_ranking_item(dict(item, image_id=False))
+        assert not is_ranking_item(dict(item, rank=3.0))
+        assert not is_ranking_item([1, 2, 3])
+
+    def test_create_ranking_again_replaces_rank(self):
+        user = create_user("jane17", "janepass")
+        image = create_image(1, "https://www.picsum.com/again")
+        ranking = create_ranking(user.get_id(), image.get_id(), 2)
+        ranking2 = create_ranking(user.get_id(), image.get_id(), 4)
+        assert ranking2.get_id() == ranking.get_id()
+        assert ranking2.get_rank() == 4
+        assert len(get_rankings_by_image(image.get_id())) == 1
+        image = get_image(image.get_id())
+        assert (image.rank_sum, image.rank_count) == (4, 1)
+
+    def test_create_rankings_with_existing_ranking(self):
+        user = create_user("jane18", "janepass")
+        image = create_image(1, "https://www.picsum.com/again")
+        ranking = create_ranking(user.get_id(), image.get_id(), 2)
+        item = {"ranker_id": user.get_id(), "image_id": image.get_id(), "rank": 3}
+        results = create_rankings([item, dict(item, rank=5)])
+        assert {result["ranking"]["id"] for result in results} == {ranking.get_id()}
+        image = get_image(image.get_id())
+        assert (image.rank_sum, image.rank_count) == (5, 1)
+
+    def test_dedupe_rankings(self):
+        user = create_user("jane19", "janepass")
+        image = create_image(1, "https://www.picsum.com/dupes")
+        index = next(i for i in Ranking.__table__.indexes if i.unique)
+        index.drop(bind=db.engine)
+        db.session.execute(
+            Ranking.__table__.insert(),
+            [
+                {"ranker_id": user.get_id(), "image_id": image.get_id(), "rank": rank}
+                for rank in (1, 2, 4)
+            ],
+        )
+        db.session.commit()
+        assert dedupe_rankings(batch_size=1) == 2
+        rebuild_index(app, index)
+        rankings = get_rankings_by_image(image.get_id())
+        assert [ranking.get_rank() for ranking in rankings] == [4]
+        image = get_image(image.get_id())
+        assert (image.rank_sum, image.rank_count) == (4, 1)
+
     def test_get_ranking(self):
         ranking = create_ranking(1, 2, 5)
         ranking2 = get_ranking(ranking.get_id())
@@ -570,3 +1131,441 @@ class DistributorsIntegrationTests(unittest.TestCase):
     def test_delete_distributor_with_invalid_id(self):
         status = delete_distributor(9080)
         assert status is False
+
+    def test_distribute(self):
+        status = distribute()
+        assert status is True
+        receivers = get_all_distributors()[-1].get_receivers()
+        assert len(receivers) == len(set(receivers))
+
+    def test_distribute_user(self):
+        user = create_user("sam1", "sampass")
+        status = distribute_user(user.get_id())
+        assert status is True
+        assert len(get_feeds_by_receiver(user.get_id())) == 1
+        assert len(get_feeds_by_sender(user.get_id())) == 1
+
+    def test_find_distribution_partner(self):
+        user = create_user("sam9", "sampass")
+        day = date(2022, 1, 1)
+        user_ids = [id for (id,) in db.session.query(User.id)]
+        db.session.execute(
+            FeedDailyCounter.__table__.insert(),
+            [{"user_id": id, "day": day, "sent": 2, "received": 2} for id in user_ids],
+        )
+        db.session.commit()
+        assert find_distribution_partner(user.get_id(), 2, True, day) is None
+        FeedDailyCounter.query.filter_by(day=day, user_id=3).update({"sent": 1})
+        db.session.commit()
+        assert find_distribution_partner(user.get_id(), 2, True, day) == 3
+        fresh = create_user("sam10", "sampass")
+        assert find_distribution_partner(user.get_id(), 2, True, day) == fresh.get_id()
+        FeedDailyCounter.query.filter_by(day=day, user_id=2).update({"sent": 0})
+        db.session.commit()
+        assert find_distribution_partner(user.get_id(), 2, True, day) == 2
+        FeedDailyCounter.query.filter_by(day=day).delete()
+        db.session.commit()
+
+    def test_export_distribution(self):
+        distributor = create_distributor()
+        create_feeds([(1, 2), (2, 3)], distributor.get_id())
+        rows = export_distribution("csv", distributor_id=distributor.get_id())
+        lines = "".join(rows).splitlines()
+        assert lines[0] == ",".join(DISTRIBUTION_COLUMNS)
+        assert len(lines) == 3
+
+    def test_export_distribution_jsonl(self):
+        distributor = create_distributor()
+        create_feeds([(1, 2), (2, 3)], distributor.get_id())
+        rows = export_distribution(
+            "jsonl", seen=False, distributor_id=distributor.get_id(), batch_size=1
+        )
+        feeds = [json.loads(line) for line in "".join(rows).splitlines()]
+        assert [feed["sender_id"] for feed in feeds] == [1, 2]
+        assert all(feed["distributor_id"] == distributor.get_id() for feed in feeds)
+
+    def test_get_distribution_table(self):
+        distributor = create_distributor()
+        feed = create_feed(1, 2, distributor.get_id())
+        table = get_distribution_table()
+        assert table[feed.get_id()] == {
+            feed.get_id(),
+            2,
+            1,
+            distributor.get_id(),
+            False,
+        }
+
+    def test_plan_distribution(self):
+        num_feeds = len(get_all_feeds())
+        plan = plan_distribution()
+        assert len(get_all_feeds()) == num_feeds
+        receivers = [receiver_id for sender_id, receiver_id in plan]
+        assert len(receivers) == len(set(receivers))
+
+
+# test imported methods from App.controllers.pair_index
+class PairIndexIntegrationTests(unittest.TestCase):
+    def test_get_pair_index(self):
+        create_feed(1, 2, 1)
+        assert (1, 2) in get_pair_index()
+
+    def test_pair_index_tracks_new_feeds(self):
+        sender = create_user("pam1", "pampass")
+        index = get_pair_index()
+        assert (sender.get_id(), 1) not in index
+        create_feeds([(sender.get_id(), 1)], 1)
+        assert (sender.get_id(), 1) in get_pair_index()
+
+    def test_pair_index_tracks_late_commits(self):
+        sender = create_user("pam3", "pampass")
+        last_feed_id = get_pair_index().last_feed_id
+        # the second feed has a lower id but commits after the first
+        for id, receiver_id in ((last_feed_id + 50, 1), (last_feed_id + 10, 2)):
+            db.session.execute(
+                Feed.__table__.insert(),
+                {
+                    "id": id,
+                    "sender_id": sender.get_id(),
+                    "receiver_id": receiver_id,
+                    "distributor_id": 1,
+                    "seen": False,
+                },
+            )
+            db.session.commit()
+            assert (sender.get_id(), receiver_id) in get_pair_index()
+
+    def test_pair_index_forgets_deleted_feeds(self):
+        sender = create_user("pam2", "pampass")
+        feed = create_feed(sender.get_id(), 1, 1)
+        assert (sender.get_id(), 1) in get_pair_index()
+        delete_feed(feed.get_id())
+        assert (sender.get_id(), 1) not in get_pair_index()
+
+
+# test imported methods from App.controllers.distribution_job
+class DistributionJobIntegrationTests(unittest.TestCase):
+    def test_request_distribution_coalesces(self):
+        job = request_distribution()
+        job2 = request_distribution()
+        assert job.get_id() == job2.get_id()
+
+    def test_run_distribution_job(self):
+        job = request_distribution()
+        ran = run_distribution_job()
+        assert ran.get_id() == job.get_id()
+        assert ran.get_status() == "done"
+        assert get_last_distribution_job().get_id() == job.get_id()
+        assert run_distribution_job() is None
+
+    def test_run_distribution_job_fails_stale_jobs(self):
+        job = DistributionJob()
+        job.status = "running"
+        job.started_at = datetime.now() - timedelta(hours=2)
+        recent = DistributionJob()
+        recent.status = "running"
+        recent.started_at = datetime.now()
+        db.session.add_all([job, recent])
+        db.session.commit()
+        assert run_distribution_job() is None
+        db.session.expire_all()
+        assert get_distribution_job(job.get_id()).get_status() == "failed"
+        assert get_distribution_job(job.get_id()).to_json()["error"] == "timed out"
+        assert get_distribution_job(recent.get_id()).get_status() == "running"
+        recent.status = "done"
+        db.session.commit()
+
+
+# test imported methods from App.controllers.feed_counter
+class FeedCounterIntegrationTests(unittest.TestCase):
+    def test_rebuild_daily_feed_counters(self):
+        sender = create_user("sam2", "sampass")
+        receiver = create_user("sam3", "sampass")
+        distributor = create_distributor()
+        create_feeds([(sender.get_id(), receiver.get_id())], distributor.get_id())
+        FeedDailyCounter.query.filter_by(user_id=sender.get_id()).delete()
+        count = rebuild_daily_feed_counters()
+        assert count > 0
+        assert get_daily_sent_count(sender.get_id()) == 1
+        assert get_daily_received_count(receiver.get_id()) == 1
+
+
+# test imported methods from App.controllers.archive
+class ArchiveIntegrationTests(unittest.TestCase):
+    def test_archive_feeds(self):
+        sender = create_user("ari1", "aripass")
+        receiver = create_user("ari2", "aripass")
+        distributor = create_distributor()
+        distributor.timestamp = datetime.now() - timedelta(days=60)
+        db.session.commit()
+        distributor_id = distributor.get_id()
+        create_feeds([(sender.get_id(), receiver.get_id())], distributor_id)
+        path = os.path.join(tempfile.mkdtemp(), "feeds.jsonl.gz")
+        count = archive_feeds(30, path)
+        assert count == 1
+        with gzip.open(path, "rt") as file:
+            feeds = [json.loads(line) for line in file]
+        assert feeds[0]["sender_id"] == sender.get_id()
+        assert get_distributor(distributor_id) is None
+        assert get_feeds_by_sender(sender.get_id()) == []
+        pairs = [(p.sender_id, p.receiver_id) for p in get_all_feed_pairs()]
+        assert (sender.get_id(), receiver.get_id()) in pairs
+        reset_pair_index()
+        assert (sender.get_id(), receiver.get_id()) in get_pair_index()
+
+    def test_archive_feeds_recovers_part(self):
+        sender = create_user("ari3", "aripass")
+        distributor = create_distributor()
+        distributor.timestamp = datetime.now() - timedelta(days=60)
+        db.session.commit()
+        distributor_id = distributor.get_id()
+        create_feeds([(sender.get_id(), 1)], distributor_id)
+        path = os.path.join(tempfile.mkdtemp(), "feeds.jsonl.gz")
+        # a batch whose delete rolled back is written again, not twice
+        with gzip.open(f"{path}.part", "wt") as part:
+            part.write(json.dumps({"distributor_id": distributor_id}) + "\n")
+        assert archive_feeds(30, path) == 1
+        with gzip.open(path, "rt") as file:
+            assert [json.loads(line)["sender_id"] for line in file] == [sender.get_id()]
+        # a batch whose delete committed before the append is kept
+        with gzip.open(f"{path}.part", "wt") as part:
+            part.write(json.dumps({"distributor_id": distributor_id}) + "\n")
+        assert archive_feeds(30, path) == 0
+        with gzip.open(path, "rt") as file:
+            assert len(file.readlines()) == 2
+        assert not os.path.exists(f"{path}.part")
+
+    def test_archive_feeds_keeps_recent_distributions(self):
+        distributor = create_distributor()
+        create_feeds([(1, 2)], distributor.get_id())
+        archive_feeds(30, os.path.join(tempfile.mkdtemp(), "feeds.jsonl.gz"))
+        assert get_distributor(distributor.get_id()) is not None
+
+
+# test imported methods from App.controllers.feed_events
+class FeedEventsIntegrationTests(unittest.TestCase):
+    def test_stream_feeds(self):
+        receiver = create_user("eve1", "evepass")
+        feed = create_feed(1, receiver.get_id(), 1)
+        stream = stream_feeds(receiver.get_id(), 0, heartbeat=0.01)
+        assert next(stream).startswith("retry:")
+        event = next(stream)
+        assert event.startswith(f"id: {feed.get_id()}\nevent: feed\n")
+        assert next(stream) == ": heartbeat\n\n"
+        feed = create_feed(2, receiver.get_id(), 1)
+        assert next(stream).startswith(f"id: {feed.get_id()}\n")
+        stream.close()
+
+    def test_stream_feeds_resumes_after_last_event_id(self):
+        receiver = create_user("eve2", "evepass")
+        feeds = [create_feed(sender_id, receiver.get_id(), 1) for sender_id in (1, 2)]
+        stream = stream_feeds(receiver.get_id(), feeds[0].get_id(), heartbeat=0.01)
+        next(stream)
+        assert next(stream).startswith(f"id: {feeds[1].get_id()}\n")
+        assert next(stream) == ": heartbeat\n\n"
+        stream.close()
+
+    def test_stream_feeds_starts_at_new_feeds(self):
+        receiver = create_user("eve3", "evepass")
+        create_feed(1, receiver.get_id(), 1)
+        stream = stream_feeds(receiver.get_id(), heartbeat=0.01)
+        next(stream)
+        assert next(stream) == ": heartbeat\n\n"
+        stream.close()
+
+
+# test imported methods from App.controllers.revision
+class RevisionIntegrationTests(unittest.TestCase):
+    def test_bump_revisions(self):
+        bump_revisions(["test:1", "test:2"])
+        bump_revisions(["test:1"])
+        db.session.commit()
+        assert get_revision_stamp("test:1")[0] == 2
+        assert get_revision_stamp("test:2")[0] == 1
+        assert get_revision_stamp("test:3") == (0, None)
+
+    def test_writes_bump_revisions(self):
+        user = create_user("rev1", "revpass")
+        rater = create_user("rev2", "revpass")
+        image = create_image(user.get_id(), "https://example.com/rev.png")
+        images = get_revision_stamp(images_resource(user.get_id()))[0]
+        create_ranking(rater.get_id(), image.get_id(), 3)
+        assert get_revision_stamp(images_resource(user.get_id()))[0] == images + 1
+        create_rating(rater.get_id(), user.get_id(), 4)
+        assert get_revision_stamp(ratings_resource(user.get_id()))[0] == 1
+        feed = create_feed(rater.get_id(), user.get_id(), 1)
+        view_feeds([feed.get_id()])
+        assert get_revision_stamp(feeds_resource(user.get_id()))[0] == 2
+        assert view_feeds([feed.get_id()]) == 0
+        assert get_revision_stamp(feeds_resource(user.get_id()))[0] == 2
+
+    def test_conditional_response(self):
+        built = []
+
+        def build():
+            built.append(True)
+            return {"ok": True}, 200
+
+        bump_revisions(["test:4"])
+        db.session.commit()
+        with app.test_request_context("/"):
+            response = conditional_response("test:4", build)
+        assert response.status_code == 200 and response.last_modified
+        etag = response.headers["ETag"]
+        with app.test_request_context("/", headers={"If-None-Match": etag}):
+            assert conditional_response("test:4", build).status_code == 304
+        with app.test_request_context("/?limit=5", headers={"If-None-Match": etag}):
+            assert conditional_response("test:4", build).status_code == 200
+        bump_revisions(["test:4"])
+        db.session.commit()
+        with app.test_request_context("/", headers={"If-None-Match": etag}):
+            assert conditional_response("test:4", build).status_code == 200
+        since = {"If-Modified-Since": response.headers["Last-Modified"]}
+        with app.test_request_context("/", headers=since):
+            assert conditional_response("test:4", build).status_code == 200
+        assert len(built) == 4
+
+
+# test imported methods from App.importer
+class ImportIntegrationTests(unittest.TestCase):
+    def test_import_files(self):
+        folder = tempfile.mkdtemp()
+        users = os.path.join(folder, "users.csv")
+        with open(users, "w") as file:
+            file.write("id,username,password\n")
+            file.write("50001,imp1,imppass\n50002,imp2,imppass\n")
+            file.write("50003,imp1,imppass\n,imp3,\n")
+        result = import_file("users", users, workers=2)
+        assert result["imported"] == 2
+        assert result["skipped"] == {
+            "username already exists": 1,
+            "password is required": 1,
+        }
+        assert authenticate("imp2", "imppass").get_id() == 50002
+        users = [
+            {"username": "imp4", "password": "imppass"},
+            {"id": 50004, "username": "imp5", "password": "imppass"},
+            {"id": 50005, "username": "imp6", "password": "imppass"},
+        ]
+        result = import_records("users", users, chunk_size=2)
+        assert result["imported"] == 2
+        assert result["skipped"] == {"id already exists": 1}
+        assert get_user_by_username("imp4").get_id() == 50005
+        images = os.path.join(folder, "images.jsonl")
+        with open(images, "w") as file:
+            for id, user_id in ((60001, 50001), (60002, 50002), (60003, 9080)):
+                file.write(json.dumps({"id": id, "user_id": user_id, "url": "u"}))
+                file.write("\n")
+        result = import_file("images", images)
+        assert result["imported"] == 2
+        assert result["skipped"] == {"user_id does not exist": 1}
+        rankings = [
+            {"ranker_id": 50001, "image_id": 60002, "rank": 2},
+            {"ranker_id": 50001, "image_id": 60002, "rank": 4},
+            {"ranker_id": 50002, "image_id": 60003, "rank": 4},
+        ]
+        result = import_records("rankings", rankings, chunk_size=2)
+        assert result["imported"] == 2
+        image = get_image(60002)
+        assert (image.rank_sum, image.rank_count) == (4, 1)
+        ratings = [
+            {"rater_id": "50001", "rated_id": "50002", "rating": "2"},
+            {"rater_id": "50001", "rated_id": "50002", "rating": "5"},
+        ]
+        assert import_records("ratings", ratings)["imported"] == 2
+        assert [r.get_rating() for r in get_ratings_by_rater(50001)] == [5]
+        assert get_average_rating_by_rated(50002) == 5
+
+
+# checks that the hot controller queries use the schema's indexes instead of scanning
+class QueryPlanTests(unittest.TestCase):
+    def assertUsesIndex(self, query, index):
+        plan = explain(query)
+        LOGGER.info(plan)
+        assert any(f"INDEX {index} " in step for step in plan)
+        # full table scans show up as SCAN steps, index lookups as SEARCH
+        assert not any(step.startswith("SCAN") for step in plan)
+
+    def test_feeds_by_receiver(self):
+        self.assertUsesIndex(
+            Feed.query.filter_by(receiver_id=1), "ix_feed_receiver_seen_id"
+        )
+
+    def test_unseen_feeds_page(self):
+        query = (
+            Feed.query.filter(Feed.receiver_id == 1, Feed.seen == False, Feed.id < 50)
+            .order_by(Feed.id.desc())
+            .limit(20)
+        )
+        self.assertUsesIndex(query, "ix_feed_receiver_seen_id")
+        assert not any("TEMP B-TREE" in step for step in explain(query))
+
+    def test_feeds_after_event_id(self):
+        query = (
+            Feed.query.filter(Feed.receiver_id == 1, Feed.id > 50)
+            .order_by(Feed.id)
+            .limit(100)
+        )
+        self.assertUsesIndex(query, "ix_feed_receiver_seen_id")
+
+    def test_top_images(self):
+        query = (
+            Image.query.filter(Image.rank_count > 0)
+            .order_by(Image.avg_rank.desc(), Image.id.desc())
+            .limit(10)
+        )
+        plan = explain(query)
+        assert any("INDEX ix_image_avg_rank_id" in step for step in plan)
+        assert not any("TEMP B-TREE" in step for step in plan)
+
+    def test_unseen_feed_count(self):
+        query = db.session.query(db.func.count(Feed.id)).filter(
+            Feed.receiver_id == 1, Feed.seen == False
+        )
+        self.assertUsesIndex(query, "ix_feed_receiver_seen_id")
+        assert "COVERING INDEX" in explain(query)[0]
+
+    def test_least_loaded_senders(self):
+        query = (
+            db.session.query(FeedDailyCounter.user_id)
+            .filter(FeedDailyCounter.day == date.today(), FeedDailyCounter.sent < 5)
+            .order_by(FeedDailyCounter.sent, FeedDailyCounter.user_id)
+            .limit(1)
+        )
+        self.assertUsesIndex(query, "ix_feed_daily_counter_day_sent")
+        assert not any("TEMP B-TREE" in step for step in explain(query))
+
+    def test_feeds_by_sender(self):
+        self.assertUsesIndex(
+            Feed.query.filter_by(sender_id=1), "ix_feed_sender_distributor"
+        )
+
+    def test_feeds_by_distributor(self):
+        self.assertUsesIndex(
+            Feed.query.filter_by(distributor_id=1), "ix_feed_distributor_id"
+        )
+
+    def test_distributors_since(self):
+        query = Distributor.query.filter(
+            Distributor.timestamp >= datetime.now() - timedelta(days=1)
+        )
+        self.assertUsesIndex(query, "ix_distributor_timestamp")
+
+    def test_images_by_user(self):
+        self.assertUsesIndex(Image.query.filter_by(user_id=1), "ix_image_user_id")
+
+    def test_rankings_by_image(self):
+        self.assertUsesIndex(Ranking.query.filter_by(image_id=1), "ix_ranking_image_id")
+
+    def test_rankings_by_ranker(self):
+        self.assertUsesIndex(
+            Ranking.query.filter_by(ranker_id=1), "ix_ranking_ranker_image"
+        )
+
+    def test_ratings_by_rated(self):
+        self.assertUsesIndex(Rating.query.filter_by(rated_id=1), "ix_rating_rated_id")
+
+    def test_ratings_by_rater(self):
+        self.assertUsesIndex(
+            Rating.query.filter_by(rater_id=1), "ix_rating_rater_rated"
+        )
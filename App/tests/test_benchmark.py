@@ -0,0 +1,25 @@
+import pytest
+
+from App.benchmark import run_distribution_benchmark, compare_benchmark
+from wsgi import app
+
+"""
+    Benchmarks
+"""
+
+
+@pytest.mark.benchmark
+def test_distribution_benchmark(tmp_path):
+    results = run_distribution_benchmark([10, 100], scratch=tmp_path / "bench.db")
+    assert results["100"]["rows_written"] > 100
+    assert results["100"]["statements"] > 0
+    comparison = compare_benchmark(results, results)
+    assert comparison["10"]["wall_time"] == 1
+
+
+@pytest.mark.benchmark
+def test_distribute_all_benchmark(tmp_path):
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    results = run_distribution_benchmark([10], "all", scratch=tmp_path / "bench.db")
+    assert results["10"]["rounds"] > 1
+    assert app.config["SQLALCHEMY_DATABASE_URI"] == uri
@@ -4,3 +4,4 @@ from .user import *
 from .feed import *
 from .ranking import *
 from .rating import *
+from .distributor import *
@@ -0,0 +1,33 @@
+import hashlib
+from datetime import timezone
+from flask import make_response, request
+
+from App.controllers import get_revision_stamp
+
+
+def conditional_response(resource, build):
+    # answers If-None-Match from the resource's revision stamp, so an unchanged poll gets
+    # a 304 before build() loads or serializes anything; If-Modified-Since is not answered
+    # because Last-Modified has whole seconds and would miss a second write in the same second
+    revision, updated_at = get_revision_stamp(resource)
+    last_modified = None
+    if updated_at:
+        last_modified = updated_at.replace(tzinfo=timezone.utc, microsecond=0)
+    # the query string selects the page, so it's part of the tag
+    variant = hashlib.md5(request.query_string).hexdigest()[:8]
+    stamp = (
+        int(updated_at.replace(tzinfo=timezone.utc).timestamp()) if updated_at else 0
+    )
+    etag = f"{revision}-{stamp}-{variant}"
+    if request.if_none_match.contains_weak(etag):
+        response = make_response("", 304)
+    else:
+        response = make_response(build())
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # responses depend on the token, so only the client may cache them and it must revalidate
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
@@ -0,0 +1,53 @@
+from datetime import datetime
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from flask_jwt import jwt_required
+
+from App.controllers import (
+    request_distribution,
+    get_last_distribution_job_json,
+    export_distribution,
+)
+
+distributor_views = Blueprint(
+    "distributor_views", __name__, template_folder="../templates"
+)
+
+
+# Request Distribution route
+@distributor_views.route("/api/distribution", methods=["POST"])
+@jwt_required()
+def request_distribution_action():
+    job = request_distribution()
+    return jsonify(job.to_json()), 202
+
+
+# Get Distribution Status route
+@distributor_views.route("/api/distribution/status", methods=["GET"])
+@jwt_required()
+def get_distribution_status_action():
+    job = get_last_distribution_job_json()
+    if job:
+        return jsonify(job), 200
+    return jsonify({"message": "No distributions requested"}), 404
+
+
+# Export Distribution route
+@distributor_views.route("/api/distribution/export", methods=["GET"])
+@jwt_required()
+def export_distribution_action():
+    format = request.args.get("format", "csv")
+    if format not in ("csv", "jsonl"):
+        return jsonify({"message": "Format must be csv or jsonl"}), 400
+    try:
+        since = request.args.get("since")
+        since = datetime.fromisoformat(since) if since else None
+    except ValueError:
+        return jsonify({"message": "Invalid since timestamp"}), 400
+    seen = request.args.get("seen")
+    if seen is not None:
+        seen = seen.lower() == "true"
+    rows = export_distribution(
+        format, since, seen, request.args.get("distributor", type=int)
+    )
+    mimetype = "text/csv" if format == "csv" else "application/x-ndjson"
+    return Response(stream_with_context(rows), mimetype=mimetype)
@@ -1,19 +1,73 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from flask_jwt import jwt_required
 
 from App.controllers import (
     get_user,
     get_feed,
     get_feed_json,
-    get_feeds_by_sender,
     get_feeds_by_sender_json,
-    get_feeds_by_receiver,
     get_feeds_by_receiver_json,
+    get_feeds_by_sender_page_json,
+    get_feeds_by_receiver_page_json,
     view_feed,
+    view_feeds,
+    get_unseen_feed_count,
+    expand_feed_senders,
+    stream_feeds,
+    feeds_resource,
 )
+from App.views.conditional import conditional_response
 
 feed_views = Blueprint("feed_views", __name__, template_folder="../templates")
 
+MAX_PAGE_SIZE = 100
+
+
+# clients opt into pagination by passing any of limit, after or seen
+def get_page_args():
+    if not {"limit", "after", "seen"} & set(request.args):
+        return None
+    limit = min(request.args.get("limit", 20, type=int), MAX_PAGE_SIZE)
+    after = request.args.get("after", type=int)
+    seen = request.args.get("seen")
+    if seen is not None:
+        seen = seen.lower() == "true"
+    return max(limit, 1), after, seen
+
+
+def is_id(value):
+    # bool is an int subclass, so true and false don't pass as ids
+    return type(value) is int
+
+
+# the body of a view feeds request: ids, at most MAX_PAGE_SIZE of them, or a
+# receiver_id with an optional up_to cursor; raises ValueError with the message
+def get_view_feeds_args():
+    data = request.json or {}
+    ids = data.get("ids")
+    receiver_id = data.get("receiver_id")
+    up_to = data.get("up_to")
+    if ids is None and receiver_id is None:
+        raise ValueError("Provide ids or receiver_id.")
+    if ids is not None and not (
+        isinstance(ids, list)
+        and len(ids) <= MAX_PAGE_SIZE
+        and all(is_id(id) for id in ids)
+    ):
+        raise ValueError(f"ids must be a list of at most {MAX_PAGE_SIZE} feed ids.")
+    if receiver_id is not None and not is_id(receiver_id):
+        raise ValueError("receiver_id must be a user id.")
+    if up_to is not None and not is_id(up_to):
+        raise ValueError("up_to must be a feed id.")
+    return ids, receiver_id, up_to
+
+
+# expand=sender adds each sender's profile to the returned feeds
+def expand_feeds(feeds):
+    if "sender" in request.args.get("expand", "").split(","):
+        expand_feed_senders(feeds)
+    return feeds
+
 
 # Get Feed route
 @feed_views.route("/api/feed/<int:id>", methods=["GET"])
@@ -21,7 +75,7 @@ feed_views = Blueprint("feed_views", __name__, template_folder="../templates")
 def get_feed_action(id):
     feed = get_feed(id)
     if feed:
-        return jsonify(get_feed_json(id)), 200
+        return jsonify(expand_feeds([get_feed_json(id)])[0]), 200
     return jsonify({"error": "Feed not found."}), 404
 
 
@@ -32,9 +86,14 @@ def get_feeds_by_sender_action(sender_id):
     user = get_user(sender_id)
     if not user:
         return jsonify({"error": "User not found."}), 404
-    feeds = get_feeds_by_sender(sender_id)
+    page = get_page_args()
+    if page:
+        page = get_feeds_by_sender_page_json(sender_id, *page)
+        expand_feeds(page["feeds"])
+        return jsonify(page), 200
+    feeds = get_feeds_by_sender_json(sender_id)
     if feeds:
-        return jsonify(get_feeds_by_sender_json(sender_id)), 200
+        return jsonify(expand_feeds(feeds)), 200
     return jsonify({"error": "Feeds not found."}), 404
 
 
@@ -42,10 +101,55 @@ def get_feeds_by_sender_action(sender_id):
 @feed_views.route("/api/feed/receiver/<int:receiver_id>", methods=["GET"])
 @jwt_required()
 def get_feeds_by_receiver_action(receiver_id):
-    feeds = get_feeds_by_receiver(receiver_id)
-    if feeds:
-        return jsonify(get_feeds_by_receiver_json(receiver_id)), 200
-    return jsonify({"error": "Feeds not found."}), 404
+    def build():
+        page = get_page_args()
+        if page:
+            page = get_feeds_by_receiver_page_json(receiver_id, *page)
+            expand_feeds(page["feeds"])
+            return jsonify(page), 200
+        feeds = get_feeds_by_receiver_json(receiver_id)
+        if feeds:
+            return jsonify(expand_feeds(feeds)), 200
+        return jsonify({"error": "Feeds not found."}), 404
+
+    # expanded sender profiles change without the receiver's feeds changing
+    if "expand" in request.args:
+        return build()
+    return conditional_response(feeds_resource(receiver_id), build)
+
+
+# Get Unseen Feed Count route
+@feed_views.route("/api/feed/receiver/<int:receiver_id>/unseen_count", methods=["GET"])
+@jwt_required()
+def get_unseen_feed_count_action(receiver_id):
+    return (
+        jsonify(
+            {
+                "receiver_id": receiver_id,
+                "unseen_count": get_unseen_feed_count(receiver_id),
+            }
+        ),
+        200,
+    )
+
+
+# Stream Feeds route
+@feed_views.route("/api/feed/receiver/<int:receiver_id>/stream", methods=["GET"])
+@jwt_required()
+def stream_feeds_action(receiver_id):
+    user = get_user(receiver_id)
+    if not user:
+        return jsonify({"error": "User not found."}), 404
+    # browsers resend the last delivered id on reconnect; the query arg lets other clients resume
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get(
+        "last_event_id"
+    )
+    last_event_id = int(last_event_id) if str(last_event_id).isdigit() else None
+    return Response(
+        stream_with_context(stream_feeds(receiver_id, last_event_id)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 # View Feed route
@@ -56,3 +160,15 @@ def view_feed_action(id):
     if feed:
         return jsonify(get_feed_json(id)), 200
     return jsonify({"error": "Feed not found."}), 404
+
+
+# View Feeds route
+@feed_views.route("/api/feed/view", methods=["POST"])
+@jwt_required()
+def view_feeds_action():
+    try:
+        ids, receiver_id, up_to = get_view_feeds_args()
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    count = view_feeds(ids, receiver_id, up_to)
+    return jsonify({"viewed": count}), 200
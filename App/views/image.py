@@ -1,3 +1,4 @@
+from datetime import timedelta
 from flask import Blueprint, jsonify, request
 from flask_jwt import jwt_required, current_identity
 
@@ -7,15 +8,51 @@ from App.controllers import (
     create_image,
     get_image,
     get_image_json,
-    get_images_by_user,
     get_images_by_user_json,
+    get_images_page_json,
+    get_top_images_json,
+    IMAGE_SORTS,
     get_image_rankings_json,
     get_average_image_rank,
     delete_image,
+    images_resource,
 )
+from App.views.conditional import conditional_response
 
 image_views = Blueprint("image_views", __name__, template_folder="../templates")
 
+MAX_PAGE_SIZE = 100
+WINDOW_UNITS = {"h": "hours", "d": "days"}
+MAX_WINDOW = timedelta(days=365)
+
+
+# clients opt into pagination by passing any of limit, page or sort
+def get_image_page_args():
+    if not {"limit", "page", "sort"} & set(request.args):
+        return None
+    limit = min(request.args.get("limit", 20, type=int), MAX_PAGE_SIZE)
+    page = request.args.get("page", 1, type=int)
+    sort = request.args.get("sort", "recent")
+    return sort, max(limit, 1), max(page, 1)
+
+
+# window is "all" (the default) or a number of hours or days such as 24h or 7d, up to MAX_WINDOW
+def get_window_arg():
+    window = request.args.get("window", "all")
+    if window == "all":
+        return None
+    if window[:-1].isdigit() and window[-1] in WINDOW_UNITS:
+        # checked in hours first, so a huge number can't overflow timedelta
+        amount = int(window[:-1])
+        hours = amount * 24 if window[-1] == "d" else amount
+        if 0 < hours <= MAX_WINDOW.days * 24:
+            return timedelta(**{WINDOW_UNITS[window[-1]]: amount})
+    raise ValueError(window)
+
+
+def sort_error():
+    return jsonify({"message": f"sort must be one of {', '.join(IMAGE_SORTS)}"}), 400
+
 
 # Post image route
 @image_views.route("/api/image", methods=["POST"])
@@ -28,6 +65,28 @@ def post_image_action():
     return jsonify({"message": "Unable to create image"}), 400
 
 
+# Get Images route
+@image_views.route("/api/image", methods=["GET"])
+@jwt_required()
+def get_images_action():
+    sort, limit, page = get_image_page_args() or ("recent", 20, 1)
+    if sort not in IMAGE_SORTS:
+        return sort_error()
+    return jsonify(get_images_page_json(None, sort, limit, page)), 200
+
+
+# Get Top Images route
+@image_views.route("/api/image/top", methods=["GET"])
+@jwt_required()
+def get_top_images_action():
+    limit = min(max(request.args.get("limit", 10, type=int), 1), MAX_PAGE_SIZE)
+    try:
+        window = get_window_arg()
+    except ValueError:
+        return jsonify({"message": "window must be all or a number of h or d"}), 400
+    return jsonify(get_top_images_json(limit, window)), 200
+
+
 # Get image route
 @image_views.route("/api/image/<int:id>", methods=["GET"])
 @jwt_required()
@@ -45,10 +104,20 @@ def get_images_by_user_action(user_id):
     user = get_user(user_id)
     if not user:
         return jsonify({"message": "User not found"}), 404
-    images = get_images_by_user(user_id)
-    if images:
-        return jsonify(get_images_by_user_json(user_id)), 200
-    return jsonify({"message": "No images found"}), 404
+
+    page = get_image_page_args()
+    if page and page[0] not in IMAGE_SORTS:
+        return sort_error()
+
+    def build():
+        if page:
+            return jsonify(get_images_page_json(user_id, *page)), 200
+        images = get_images_by_user_json(user_id)
+        if images:
+            return jsonify(images), 200
+        return jsonify({"message": "No images found"}), 404
+
+    return conditional_response(images_resource(user_id), build)
 
 
 # Get Average Image Rank route
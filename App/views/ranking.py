@@ -6,6 +6,7 @@ from App.controllers import (
     get_user,
     get_image,
     create_ranking,
+    create_rankings,
     get_ranking,
     get_ranking_json,
     get_rankings_by_ranker,
@@ -18,6 +19,8 @@ from App.controllers import (
 
 ranking_views = Blueprint("ranking_views", __name__, template_folder="../templates")
 
+MAX_BATCH_SIZE = 100
+
 
 # Create Ranking route
 @ranking_views.route("/api/ranking", methods=["POST"])
@@ -35,6 +38,24 @@ def create_ranking_action():
         return jsonify({"message": "Something went wrong"}), 500
 
 
+# Create Rankings route
+@ranking_views.route("/api/ranking/batch", methods=["POST"])
+@jwt_required()
+def create_rankings_action():
+    data = request.json or {}
+    rankings = data.get("rankings")
+    if not isinstance(rankings, list) or not rankings:
+        return jsonify({"message": "rankings must be a non-empty list"}), 400
+    if len(rankings) > MAX_BATCH_SIZE:
+        return (
+            jsonify({"message": f"At most {MAX_BATCH_SIZE} rankings per batch"}),
+            400,
+        )
+    results = create_rankings(rankings)
+    created = sum("ranking" in result for result in results)
+    return jsonify({"created": created, "results": results}), 201 if created else 400
+
+
 # Get Ranking route
 @ranking_views.route("/api/ranking/<int:id>", methods=["GET"])
 @jwt_required()
@@ -8,13 +8,15 @@ from App.controllers import (
     get_rating_json,
     get_ratings_by_rater,
     get_ratings_by_rater_json,
-    get_ratings_by_rated,
     get_ratings_by_rated_json,
     get_average_rating_by_rated,
+    get_user_rating_stats_json,
     get_rating,
     update_rating,
     delete_rating,
+    ratings_resource,
 )
+from App.views.conditional import conditional_response
 
 rating_views = Blueprint("rating_views", __name__, template_folder="../templates")
 
@@ -61,11 +63,14 @@ def get_ratings_by_rater_action(rater_id):
 @rating_views.route("/api/ratings/rated/<int:rated_id>", methods=["GET"])
 @jwt_required()
 def get_ratings_by_rated_action(rated_id):
-    ratings = get_ratings_by_rated(rated_id)
-    if ratings:
-        return jsonify(get_ratings_by_rated(rated_id)), 200
-    else:
-        return jsonify({"message": "Rated does not exist"}), 404
+    def build():
+        ratings = get_ratings_by_rated_json(rated_id)
+        if ratings:
+            return jsonify(ratings), 200
+        else:
+            return jsonify({"message": "Rated does not exist"}), 404
+
+    return conditional_response(ratings_resource(rated_id), build)
 
 
 # Get Average Rating by Rated route
@@ -79,6 +84,16 @@ def get_average_rating_by_rated_action(rated_id):
         return jsonify({"message": "Rated does not exist"}), 404
 
 
+# Get Rating Stats by Rated route
+@rating_views.route("/api/ratings/rated/<int:rated_id>/stats", methods=["GET"])
+@jwt_required()
+def get_rating_stats_by_rated_action(rated_id):
+    if get_user(rated_id):
+        return jsonify(get_user_rating_stats_json(rated_id)), 200
+    else:
+        return jsonify({"message": "Rated does not exist"}), 404
+
+
 # Update Rating route
 @rating_views.route("/api/ratings/<int:id>", methods=["PUT"])
 @jwt_required()
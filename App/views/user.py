@@ -12,8 +12,11 @@ from App.controllers import (
     get_ratings_by_rated_json,
     get_average_rating_by_rated,
     get_images_by_user_json,
-    distribute_all,
+    distribute_user,
+    request_distribution,
+    USERS_RESOURCE,
 )
+from App.views.conditional import conditional_response
 
 user_views = Blueprint("user_views", __name__, template_folder="../templates")
 
@@ -38,7 +41,9 @@ def signup_action():
         return jsonify({"message": "Username taken."}), 400
     user = create_user(data["username"], data["password"])
     if user:
-        distribute_all()
+        # the new user's own feeds right away, the rest of the round in the background
+        distribute_user(user.get_id())
+        request_distribution()
         return jsonify({"message": f"user {data['username']} created"}), 201
     return jsonify({"message": "User not created"}), 400
 
@@ -61,10 +66,13 @@ def set_user_avatar(id):
 @user_views.route("/api/users", methods=["GET"])
 @jwt_required()
 def get_users_all_action():
-    users = get_all_users_json()
-    if users:
-        return jsonify(users), 200
-    return jsonify({"message": "No users found"}), 404
+    def build():
+        users = get_all_users_json()
+        if users:
+            return jsonify(users), 200
+        return jsonify({"message": "No users found"}), 404
+
+    return conditional_response(USERS_RESOURCE, build)
 
 
 # Get user by id route
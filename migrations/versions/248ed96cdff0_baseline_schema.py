@@ -0,0 +1,121 @@
+"""baseline schema
+
+The tables as flask init created them before the migrations were added.
+The app runs create_all on start, so only the missing tables are created.
+
+Revision ID: 248ed96cdff0
+Revises: 
+Create Date: 2026-10-18 10:52:48.431996
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "248ed96cdff0"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def has_table(name):
+    return name in sa.inspect(op.get_bind()).get_table_names()
+
+
+def upgrade():
+    if not has_table("distributor"):
+        op.create_table(
+            "distributor",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("num_profiles", sa.Integer(), nullable=False),
+            sa.Column("timestamp", sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+        )
+    if not has_table("user"):
+        op.create_table(
+            "user",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("avatar", sa.String(length=120), nullable=False),
+            sa.Column("username", sa.String(), nullable=False),
+            sa.Column("password", sa.String(length=120), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("username"),
+        )
+    if not has_table("feed"):
+        op.create_table(
+            "feed",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("sender_id", sa.Integer(), nullable=False),
+            sa.Column("receiver_id", sa.Integer(), nullable=False),
+            sa.Column("distributor_id", sa.Integer(), nullable=False),
+            sa.Column("seen", sa.Boolean(), nullable=True),
+            sa.ForeignKeyConstraint(
+                ["distributor_id"],
+                ["distributor.id"],
+            ),
+            sa.ForeignKeyConstraint(
+                ["receiver_id"],
+                ["user.id"],
+            ),
+            sa.ForeignKeyConstraint(
+                ["sender_id"],
+                ["user.id"],
+            ),
+            sa.PrimaryKeyConstraint("id"),
+        )
+    if not has_table("image"):
+        op.create_table(
+            "image",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("url", sa.String(length=120), nullable=False),
+            sa.ForeignKeyConstraint(
+                ["user_id"],
+                ["user.id"],
+            ),
+            sa.PrimaryKeyConstraint("id"),
+        )
+    if not has_table("rating"):
+        op.create_table(
+            "rating",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("rater_id", sa.Integer(), nullable=False),
+            sa.Column("rated_id", sa.Integer(), nullable=False),
+            sa.Column("rating", sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(
+                ["rated_id"],
+                ["user.id"],
+            ),
+            sa.ForeignKeyConstraint(
+                ["rater_id"],
+                ["user.id"],
+            ),
+            sa.PrimaryKeyConstraint("id"),
+        )
+    if not has_table("ranking"):
+        op.create_table(
+            "ranking",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("ranker_id", sa.Integer(), nullable=False),
+            sa.Column("image_id", sa.Integer(), nullable=False),
+            sa.Column("rank", sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(
+                ["image_id"],
+                ["image.id"],
+            ),
+            sa.ForeignKeyConstraint(
+                ["ranker_id"],
+                ["user.id"],
+            ),
+            sa.PrimaryKeyConstraint("id"),
+        )
+
+
+def downgrade():
+    op.drop_table("ranking")
+    op.drop_table("rating")
+    op.drop_table("image")
+    op.drop_table("feed")
+    op.drop_table("user")
+    op.drop_table("distributor")
@@ -0,0 +1,257 @@
+"""indexes, running totals and new tables
+
+The index pack, the running rank totals on image, ranking.ranked_at, the
+unique ranking and rating pairs, and the distribution_job,
+feed_daily_counter, feed_pair, resource_revision and user_rating_stats
+tables. Repeated rankings and ratings are deleted, keeping the newest,
+before their indexes become unique, and the image totals are filled in
+from the rankings.
+
+The app runs create_all on start, which creates new tables with their
+indexes, and flask create-indexes may already have added some indexes, so
+only what is missing is created; an index that isn't unique yet is rebuilt.
+
+Revision ID: 59054a4ddaf5
+Revises: 248ed96cdff0
+Create Date: 2026-10-18 10:52:50.246433
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "59054a4ddaf5"
+down_revision = "248ed96cdff0"
+branch_labels = None
+depends_on = None
+
+
+def has_table(name):
+    return name in sa.inspect(op.get_bind()).get_table_names()
+
+
+def add_column(table, column):
+    columns = sa.inspect(op.get_bind()).get_columns(table)
+    if column.name in {existing["name"] for existing in columns}:
+        return False
+    with op.batch_alter_table(table) as batch_op:
+        batch_op.add_column(column)
+    return True
+
+
+def create_index(name, table, columns, unique=False):
+    indexes = sa.inspect(op.get_bind()).get_indexes(table)
+    existing = next((index for index in indexes if index["name"] == name), None)
+    if existing and bool(existing["unique"]) == unique:
+        return
+    if existing:
+        op.drop_index(name, table_name=table)
+    op.create_index(name, table, columns, unique=unique)
+
+
+def delete_duplicates(name, columns, batch_size=500):
+    # the batched cleanup of App.database.delete_duplicates on the migration's
+    # connection; each batch commits on its own so a large table isn't locked
+    # for the whole upgrade
+    table = sa.table(name, sa.column("id"), *(sa.column(column) for column in columns))
+    keys = [table.c[column] for column in columns]
+    delete_older = table.delete().where(
+        sa.and_(*(key == sa.bindparam(f"b_{key.name}") for key in keys)),
+        table.c.id < sa.bindparam("b_id"),
+    )
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        while True:
+            groups = bind.execute(
+                sa.select(*keys, sa.func.max(table.c.id))
+                .group_by(*keys)
+                .having(sa.func.count() > 1)
+                .limit(batch_size)
+            ).fetchall()
+            if not groups:
+                break
+            bind.execute(
+                delete_older,
+                [
+                    dict(zip([f"b_{key.name}" for key in keys] + ["b_id"], group))
+                    for group in groups
+                ],
+            )
+
+
+def upgrade():
+    if not has_table("distribution_job"):
+        op.create_table(
+            "distribution_job",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("status", sa.String(length=20), nullable=False),
+            sa.Column("requested_at", sa.DateTime(), nullable=True),
+            sa.Column("started_at", sa.DateTime(), nullable=True),
+            sa.Column("finished_at", sa.DateTime(), nullable=True),
+            sa.Column("rounds", sa.Integer(), nullable=True),
+            sa.Column("error", sa.String(length=255), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+        )
+    create_index("ix_distribution_job_status", "distribution_job", ["status"])
+    if not has_table("resource_revision"):
+        op.create_table(
+            "resource_revision",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("resource", sa.String(length=64), nullable=False),
+            sa.Column("revision", sa.Integer(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("resource"),
+        )
+    if not has_table("feed_daily_counter"):
+        op.create_table(
+            "feed_daily_counter",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("day", sa.Date(), nullable=False),
+            sa.Column("sent", sa.Integer(), nullable=False),
+            sa.Column("received", sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(
+                ["user_id"],
+                ["user.id"],
+            ),
+            sa.PrimaryKeyConstraint("id"),
+        )
+    create_index(
+        "ix_feed_daily_counter_day_received",
+        "feed_daily_counter",
+        ["day", "received", "user_id"],
+    )
+    create_index(
+        "ix_feed_daily_counter_day_sent",
+        "feed_daily_counter",
+        ["day", "sent", "user_id"],
+    )
+    create_index(
+        "ix_feed_daily_counter_day_user",
+        "feed_daily_counter",
+        ["day", "user_id"],
+        unique=True,
+    )
+    if not has_table("feed_pair"):
+        op.create_table(
+            "feed_pair",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("sender_id", sa.Integer(), nullable=False),
+            sa.Column("receiver_id", sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(
+                ["receiver_id"],
+                ["user.id"],
+            ),
+            sa.ForeignKeyConstraint(
+                ["sender_id"],
+                ["user.id"],
+            ),
+            sa.PrimaryKeyConstraint("id"),
+        )
+    create_index(
+        "ix_feed_pair_receiver_sender",
+        "feed_pair",
+        ["receiver_id", "sender_id"],
+        unique=True,
+    )
+    create_index("ix_feed_pair_sender_id", "feed_pair", ["sender_id"])
+    if not has_table("user_rating_stats"):
+        op.create_table(
+            "user_rating_stats",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("rating_sum", sa.Integer(), nullable=False),
+            sa.Column("rating_count", sa.Integer(), nullable=False),
+            sa.Column("count_1", sa.Integer(), nullable=False),
+            sa.Column("count_2", sa.Integer(), nullable=False),
+            sa.Column("count_3", sa.Integer(), nullable=False),
+            sa.Column("count_4", sa.Integer(), nullable=False),
+            sa.Column("count_5", sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(
+                ["user_id"],
+                ["user.id"],
+            ),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("user_id"),
+        )
+    create_index("ix_distributor_timestamp", "distributor", ["timestamp"])
+    create_index("ix_feed_distributor_id", "feed", ["distributor_id"])
+    create_index("ix_feed_receiver_seen_id", "feed", ["receiver_id", "seen", "id"])
+    create_index("ix_feed_sender_distributor", "feed", ["sender_id", "distributor_id"])
+
+    # existing rows start from zero totals and the time of the migration
+    add_column(
+        "image", sa.Column("rank_sum", sa.Integer(), nullable=False, server_default="0")
+    )
+    add_column(
+        "image",
+        sa.Column("rank_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+    add_column(
+        "image", sa.Column("avg_rank", sa.Float(), nullable=False, server_default="0")
+    )
+    if add_column("ranking", sa.Column("ranked_at", sa.DateTime(), nullable=True)):
+        op.execute("UPDATE ranking SET ranked_at = CURRENT_TIMESTAMP")
+        with op.batch_alter_table("ranking") as batch_op:
+            batch_op.alter_column(
+                "ranked_at", existing_type=sa.DateTime(), nullable=False
+            )
+
+    # a ranker's latest ranking of an image and a rater's latest rating of a user are kept
+    delete_duplicates("ranking", ["ranker_id", "image_id"])
+    delete_duplicates("rating", ["rater_id", "rated_id"])
+    create_index("ix_image_avg_rank_id", "image", ["avg_rank", "id"])
+    create_index("ix_image_user_id", "image", ["user_id"])
+    create_index("ix_ranking_image_id", "ranking", ["image_id"])
+    create_index("ix_ranking_ranked_at", "ranking", ["ranked_at"])
+    create_index(
+        "ix_ranking_ranker_image", "ranking", ["ranker_id", "image_id"], unique=True
+    )
+    create_index("ix_rating_rated_id", "rating", ["rated_id"])
+    create_index(
+        "ix_rating_rater_rated", "rating", ["rater_id", "rated_id"], unique=True
+    )
+
+    # the same totals flask recompute-image-aggregates computes
+    op.execute(
+        "UPDATE image SET "
+        "rank_sum = (SELECT coalesce(sum(rank), 0) FROM ranking WHERE ranking.image_id = image.id), "
+        "rank_count = (SELECT count(id) FROM ranking WHERE ranking.image_id = image.id)"
+    )
+    op.execute(
+        "UPDATE image SET avg_rank = CASE WHEN rank_count > 0 "
+        "THEN rank_sum * 1.0 / rank_count ELSE 0 END"
+    )
+
+
+def downgrade():
+    op.drop_index("ix_rating_rater_rated", table_name="rating")
+    op.drop_index("ix_rating_rated_id", table_name="rating")
+    op.drop_index("ix_ranking_ranker_image", table_name="ranking")
+    op.drop_index("ix_ranking_ranked_at", table_name="ranking")
+    op.drop_index("ix_ranking_image_id", table_name="ranking")
+    with op.batch_alter_table("ranking") as batch_op:
+        batch_op.drop_column("ranked_at")
+    op.drop_index(op.f("ix_image_user_id"), table_name="image")
+    op.drop_index("ix_image_avg_rank_id", table_name="image")
+    with op.batch_alter_table("image") as batch_op:
+        batch_op.drop_column("avg_rank")
+        batch_op.drop_column("rank_count")
+        batch_op.drop_column("rank_sum")
+    op.drop_index("ix_feed_sender_distributor", table_name="feed")
+    op.drop_index("ix_feed_receiver_seen_id", table_name="feed")
+    op.drop_index("ix_feed_distributor_id", table_name="feed")
+    op.drop_index(op.f("ix_distributor_timestamp"), table_name="distributor")
+    op.drop_table("user_rating_stats")
+    op.drop_index(op.f("ix_feed_pair_sender_id"), table_name="feed_pair")
+    op.drop_index("ix_feed_pair_receiver_sender", table_name="feed_pair")
+    op.drop_table("feed_pair")
+    op.drop_index("ix_feed_daily_counter_day_user", table_name="feed_daily_counter")
+    op.drop_index("ix_feed_daily_counter_day_sent", table_name="feed_daily_counter")
+    op.drop_index("ix_feed_daily_counter_day_received", table_name="feed_daily_counter")
+    op.drop_table("feed_daily_counter")
+    op.drop_table("resource_revision")
+    op.drop_index(op.f("ix_distribution_job_status"), table_name="distribution_job")
+    op.drop_table("distribution_job")
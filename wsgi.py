@@ -1,9 +1,17 @@
-import click, pytest, sys
+import click, pytest, sys, time
 from flask import Flask
 from flask.cli import with_appcontext, AppGroup
 
-from App.database import create_db, get_migrate
+from App.database import create_db, create_indexes, rebuild_index, get_migrate
+from App.benchmark import (
+    run_distribution_benchmark,
+    compare_benchmark,
+    save_benchmark,
+    load_benchmark,
+)
+from App.importer import import_file, IMPORT_KINDS
 from App.main import create_app
+from App.models import Ranking, Rating
 from App.controllers import (
     create_user,
     get_all_users_json,
@@ -13,10 +21,20 @@ from App.controllers import (
     distribute_all,
     distribute,
     get_all_distributors,
-    get_feeds_by_receiver,
     get_feed,
     view_feed,
+    view_feeds,
     get_distributor_json,
+    run_distribution_job,
+    rebuild_daily_feed_counters,
+    recompute_image_aggregates,
+    dedupe_rankings,
+    dedupe_ratings,
+    rebuild_user_rating_stats,
+    iter_distribution_rows,
+    export_distribution,
+    plan_distribution,
+    archive_feeds,
 )
 
 # This commands file allow you to create convenient CLI commands for testing controllers
@@ -32,6 +50,14 @@ def initialize():
     print("database intialized")
 
 
+@app.cli.command(
+    "create-indexes", help="Adds any missing indexes to an existing database"
+)
+def create_indexes_command():
+    indexes = create_indexes(app)
+    print(f"{len(indexes)} indexes checked")
+
+
 """
 User Commands
 """
@@ -142,22 +168,145 @@ def distribute_data_command():
         distributors = get_all_distributors()
         print(distributors)
         print("FEED ID  |  RECEIVER  |  SENDER  |  DISTRIBUTOR  |  SEEN")
-        for distributor in distributors:
-            for feed in distributor.feed:
-                print(
-                    f"    {feed.id}    |    {feed.receiver_id}    |    {feed.sender_id}    |    {feed.distributor_id}    |   {feed.seen}    "
-                )
+        for feed in iter_distribution_rows():
+            print(
+                f"    {feed.id}    |    {feed.receiver_id}    |    {feed.sender_id}    |    {feed.distributor_id}    |   {feed.seen}    "
+            )
     else:
         print("data not distributed - all profiles at limit")
 
 
+@app.cli.command("distribute-plan")
+@click.option("--limit", type=int, default=None)
+@click.option("--show/--no-show", default=False)
+def distribute_plan_command(limit, show):
+    start = time.perf_counter()
+    plan = plan_distribution(limit)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(
+        f"next distribution would create {len(plan)} feeds (planned in {elapsed:.1f}ms)"
+    )
+    if show:
+        print("SENDER  |  RECEIVER")
+        for sender_id, receiver_id in plan:
+            print(f"    {sender_id}    |    {receiver_id}    ")
+
+
 @app.cli.command("distribute-all")
-def distribute_all_command():
-    counter = distribute_all()
+@click.argument("chunk-size", default=0)
+@click.argument("workers", default=1)
+def distribute_all_command(chunk_size, workers):
+    counter = distribute_all(chunk_size or None, workers)
     if counter:
         print(f"{counter} distributions made")
 
 
+@app.cli.command("distribution-worker")
+@click.argument("interval", default=30)
+@click.argument("workers", default=1)
+def distribution_worker_command(interval, workers):
+    print("distribution worker started")
+    while True:
+        job = run_distribution_job(workers)
+        if job:
+            print(
+                f"job {job.get_id()} {job.get_status()} after {job.get_rounds()} distributions"
+            )
+        else:
+            time.sleep(interval)
+
+
+@app.cli.command(
+    "recompute-image-aggregates",
+    help="Recomputes every image's rank totals from its rankings",
+)
+def recompute_image_aggregates_command():
+    count = recompute_image_aggregates()
+    print(f"{count} images recomputed")
+
+
+@app.cli.command(
+    "dedupe-rankings-ratings",
+    help="Deletes repeated rankings and ratings, then makes their indexes unique",
+)
+@click.option("--batch-size", default=500)
+def dedupe_rankings_ratings_command(batch_size):
+    print(f"{dedupe_rankings(batch_size)} duplicate rankings deleted")
+    print(f"{dedupe_ratings(batch_size)} duplicate ratings deleted")
+    for model in (Ranking, Rating):
+        for index in model.__table__.indexes:
+            if index.unique:
+                print(f"{rebuild_index(app, index)} rebuilt")
+
+
+@app.cli.command(
+    "backfill-rating-stats", help="Rebuilds every user's rating stats from the ratings"
+)
+def backfill_rating_stats_command():
+    count = rebuild_user_rating_stats()
+    print(f"{count} users' rating stats rebuilt")
+
+
+@app.cli.command("backfill-feed-counters")
+def backfill_feed_counters_command():
+    count = rebuild_daily_feed_counters()
+    print(f"{count} daily feed counters rebuilt")
+
+
+@app.cli.command("benchmark-distribution")
+@click.option("--sizes", default="10,100,1000,10000")
+@click.option("--mode", type=click.Choice(["round", "all"]), default="round")
+@click.option("--workers", default=1)
+@click.option("--output", default="benchmark.json")
+@click.option("--baseline", default=None)
+def benchmark_distribution_command(sizes, mode, workers, output, baseline):
+    sizes = [int(size) for size in sizes.split(",")]
+    results = run_distribution_benchmark(sizes, mode, workers)
+    print("USERS  |  TIME (s)  |  STATEMENTS  |  ROWS WRITTEN  |  PEAK RSS (KB)")
+    for result in results.values():
+        print(
+            f"  {result['users']}  |  {result['wall_time']}  |  {result['statements']}  |  {result['rows_written']}  |  {result['peak_rss_kb']}  "
+        )
+    save_benchmark(results, output)
+    print(f"results saved to {output}")
+    if baseline:
+        for size, ratios in compare_benchmark(
+            results, load_benchmark(baseline)
+        ).items():
+            print(f"{size} users compared to baseline: {ratios}")
+
+
+@app.cli.command("archive-feeds")
+@click.option("--days", default=30, help="Archive distributions older than this")
+@click.option("--output", default=None, help="Path of the gzipped jsonl archive")
+@click.option("--batch-size", default=500)
+def archive_feeds_command(days, output, batch_size):
+    count = archive_feeds(days, output, batch_size)
+    print(f"{count} feeds archived")
+
+
+@app.cli.command(
+    "import", help="Imports users, images, rankings or ratings from a csv or jsonl file"
+)
+@click.argument("kind", type=click.Choice(IMPORT_KINDS))
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", type=click.Choice(["csv", "jsonl"]), default=None)
+@click.option("--chunk-size", default=1000)
+@click.option("--workers", default=1, help="Processes hashing user passwords")
+def import_command(kind, path, format, chunk_size, workers):
+    def report(read, imported, seconds):
+        rate = imported / seconds if seconds else 0
+        print(f"{read} read, {imported} imported ({rate:.0f} rows/s)")
+
+    result = import_file(kind, path, format, chunk_size, workers, report)
+    for reason, count in result["skipped"].items():
+        print(f"{count} skipped: {reason}")
+    print(
+        f"{result['imported']} {kind} imported in {result['seconds']}s "
+        f"({result['rows_per_second']} rows/s)"
+    )
+
+
 @app.cli.command("view-profile")
 @click.argument("feed-id", default=1)
 def view_profile_command(feed_id):
@@ -171,24 +320,31 @@ def view_profile_command(feed_id):
 @app.cli.command("view-all-feeds")
 @click.argument("receiver-id", default=1)
 def view_all_feeds_command(receiver_id):
-    feeds = get_feeds_by_receiver(receiver_id)
-    if feeds:
-        for feed in feeds:
-            view_feed(feed.id)
-            print("all feeds viewed")
+    count = view_feeds(receiver_id=receiver_id)
+    if count:
+        print(f"all feeds viewed ({count})")
     else:
-        print("no feeds found")
+        print("no unseen feeds found")
 
 
 @app.cli.command("print-distribution")
 def print_distribution_command():
-    distributors = get_all_distributors()
     print("FEED ID  |  RECEIVER  |  SENDER  |  DISTRIBUTOR  |  SEEN")
-    for distributor in distributors:
-        for feed in distributor.feed:
-            print(
-                f"    {feed.id}    |    {feed.receiver_id}    |    {feed.sender_id}    |    {feed.distributor_id}    |   {feed.seen}    "
-            )
+    for feed in iter_distribution_rows():
+        print(
+            f"    {feed.id}    |    {feed.receiver_id}    |    {feed.sender_id}    |    {feed.distributor_id}    |   {feed.seen}    "
+        )
+
+
+@app.cli.command("export-distribution")
+@click.option("--format", type=click.Choice(["csv", "jsonl"]), default="csv")
+@click.option("--since", type=click.DateTime(), default=None)
+@click.option("--seen/--unseen", default=None)
+@click.option("--distributor", type=int, default=None)
+@click.option("--output", type=click.File("w"), default="-")
+def export_distribution_command(format, since, seen, distributor, output):
+    for chunk in export_distribution(format, since, seen, distributor):
+        output.write(chunk)
 
 
 @app.cli.command("print-dists")